@@ -0,0 +1,21 @@
+"""
+项目内共用的预编译正则。
+
+集中在模块导入时编译一次，调用方直接使用 Pattern 对象，不经过 re 模块的缓存查找。
+"""
+
+from __future__ import annotations
+
+import re
+
+# 用 \A/\Z 而非 ^/$，避免带结尾换行的域名通过校验
+DOMAIN_RE: re.Pattern[str] = re.compile(r"\A[A-Za-z0-9.-]+\.[A-Za-z]{2,}\Z")
+# 合法的子域前缀：一个或多个以点分隔的 DNS 标签（小写）
+LABEL_RE: re.Pattern[str] = re.compile(
+    r"\A[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?(\.[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?)*\Z"
+)
+NEWLINE_RE: re.Pattern[str] = re.compile(r"\r\n?")
+
+# 直接在原始字节上匹配，避免整段 decode + lower；兼容 <title lang="en"> 等带属性的写法
+HTML_TITLE_RE: re.Pattern[bytes] = re.compile(rb"<title[^>]*>([^<]{1,200})</title>", re.IGNORECASE)
+HTML_HEAD_CLOSE_RE: re.Pattern[bytes] = re.compile(rb"</head>", re.IGNORECASE)
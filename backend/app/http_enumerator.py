@@ -13,23 +13,37 @@ from __future__ import annotations
 
 import asyncio
 import datetime as dt
-import json
 import os
+import socket
 import ssl
-from typing import Dict, Optional, Set, Tuple, List
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, Optional, Set, Tuple, List
 import aiohttp
+import orjson
 from aiohttp import ClientTimeout, TCPConnector
-from urllib.parse import urlparse
 
 from loguru import logger
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import insert
+
+try:
+    import aiodns
+except ImportError:  # pragma: no cover - aiodns 为声明依赖，缺失时仅跳过 DNS 预检查
+    aiodns = None
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from ._patterns import HTML_HEAD_CLOSE_RE, HTML_TITLE_RE, LABEL_RE
 from .models import Subdomain, SubdomainRun, Wordlist
 from .run_progress import clear_progress, clear_stop, increment_progress, is_stopped, set_progress
 
 LOG_LIMIT = 4000
+# 每个运行在内存中保留的最近日志行数，落库时再截断为 LOG_LIMIT 字符
+LOG_BUFFER_LINES = 200
+# 停止接口与枚举器共用的停止日志，枚举器据此判断停止接口是否已写入
+_STOP_LOG_LINE = "⏹ 任务已被用户停止"
 DEFAULT_WORDLIST_TYPE = "subdomain"
 
 # 配置参数
@@ -38,20 +52,83 @@ REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "5"))
 MAX_RESPONSE_SIZE = int(os.getenv("MAX_RESPONSE_SIZE", "4096"))
 VERIFY_SSL = os.getenv("VERIFY_SSL", "false").lower() == "true"
 ENABLE_GET_FALLBACK = os.getenv("ENABLE_GET_FALLBACK", "true").lower() == "true"
+# HEAD/OPTIONS 已拿到状态码、server 等信息；标题仅作展示，默认不再额外 GET
+ENABLE_TITLE_FETCH = os.getenv("ENABLE_TITLE_FETCH", "false").lower() == "true"
 USER_AGENT = os.getenv("USER_AGENT", "XTools/1.0 (HTTP Subdomain Enumerator)")
+# 空闲连接保活时长（秒）：同一子域的 HEAD 探测、补充 GET 与跳转可复用已建立的 TCP/TLS 连接
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+# 结果入库节奏：每累计 RESULT_FLUSH_SIZE 个结果或每 RESULT_FLUSH_INTERVAL 秒提交一次
+RESULT_FLUSH_SIZE = 200
+RESULT_FLUSH_INTERVAL = 1.0
+# worker 与 writer 之间结果队列的容量，需明显大于 RESULT_FLUSH_SIZE 以免正常批次就触发背压
+RESULT_QUEUE_SIZE = 1024
 
 # DNS 配置
 DNS_TIMEOUT = int(os.getenv("DNS_TIMEOUT", "2"))
 DNS_RETRIES = int(os.getenv("DNS_RETRIES", "2"))
+# DNS 阶段并发：UDP 查询很轻量，可远高于 HTTP 阶段的 MAX_CONCURRENT_REQUESTS
+DNS_CONCURRENCY = int(os.getenv("DNS_CONCURRENCY", "500"))
+# 泛解析 IP 上最多实际探测的子域数量，用于发现基于 Host 头的虚拟主机，其余直接跳过
+WILDCARD_PROBE_LIMIT = int(os.getenv("WILDCARD_PROBE_LIMIT", "50"))
+# 多数目标仅有 IPv4，可关闭 AAAA 查询以减少 NXDOMAIN 开销
+ENABLE_IPV6 = os.getenv("ENABLE_IPV6", "true").lower() == "true"
 
 _ssl_context: Optional[ssl.SSLContext] = None
 
+_PIPELINE_DONE = object()
+
+# 视为存活的 4xx 状态码，编码为位图：第 n 位为 1 表示状态码 n 有效
+_VALID_4XX_MASK = 0
+for _status in (
+    400, 401, 403, 404, 405, 406, 407, 408, 409, 410,
+    411, 412, 413, 414, 415, 416, 417, 418, 421, 422,
+    423, 424, 425, 426, 428, 429, 431, 451,
+):
+    _VALID_4XX_MASK |= 1 << _status
+del _status
+
+_SUBDOMAIN_INSERT = insert(Subdomain.__table__).prefix_with("OR IGNORE")
+
+# 可能包含 <title> 的内容类型；其余类型（json、图片等）不做兜底 GET
+_HTML_CONTENT_TYPES = frozenset({"text/html", "application/xhtml+xml"})
+
+
+_log_buffers: Dict[int, Deque[str]] = {}
+
+
+def _get_log_buffer(run: SubdomainRun) -> Deque[str]:
+    """按 run_id 缓存日志行；首次使用时以数据库中已有的 log_snippet 作为初始内容。"""
+    buffer = _log_buffers.get(run.id)
+    if buffer is None:
+        buffer = deque((run.log_snippet or "").splitlines(), maxlen=LOG_BUFFER_LINES)
+        _log_buffers[run.id] = buffer
+    return buffer
 
-def _append_log(log: str, new_line: str) -> str:
-    combined = (log + "\n" + new_line).strip()
-    if len(combined) > LOG_LIMIT:
-        return combined[-LOG_LIMIT:]
-    return combined
+
+def _render_run_log(run: SubdomainRun, line: str) -> str:
+    """
+    在枚举流程之外追加一行日志：写入同一个内存缓冲，避免之后的批量落库覆盖掉这一行。
+
+    只返回截断后的日志文本，不修改 run，调用方自行决定如何落库，避免 ORM 脏检查触发额外 UPDATE。
+    """
+    buffer = _get_log_buffer(run)
+    buffer.extend(line.splitlines())
+    return "\n".join(buffer)[-LOG_LIMIT:]
+
+
+def _release_run_log(run_id: int) -> None:
+    """运行进入终态后释放其日志缓冲。"""
+    _log_buffers.pop(run_id, None)
+
+
+def _stop_logged(run_id: int) -> bool:
+    """
+    停止接口已把停止日志写入缓冲时返回 True，枚举器收尾时不再重复追加。
+
+    停止后仍在途的结果会接在停止日志之后落库，因此检查整个缓冲而不只是最后一行。
+    """
+    return _STOP_LOG_LINE in _log_buffers.get(run_id, ())
 
 
 def _safe_snippet(text: str, limit: int = 200) -> str:
@@ -59,6 +136,20 @@ def _safe_snippet(text: str, limit: int = 200) -> str:
     return " ".join(text.split())[:limit]
 
 
+def _tuned_socket(addr_info) -> socket.socket:
+    """
+    TCPConnector 的 socket_factory：连接前显式开启 TCP_NODELAY，
+    Linux 下同时开启 TCP_QUICKACK，避免小包 HEAD/OPTIONS 请求被 Nagle/延迟 ACK 拖慢。
+    """
+    family, type_, proto, _, _ = addr_info
+    sock = socket.socket(family=family, type=type_, proto=proto)
+    if family in (socket.AF_INET, socket.AF_INET6):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if hasattr(socket, "TCP_QUICKACK"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+    return sock
+
+
 def _get_ssl_context() -> ssl.SSLContext:
     """缓存 SSL 配置，避免重复创建"""
     global _ssl_context
@@ -74,41 +165,26 @@ def _get_ssl_context() -> ssl.SSLContext:
 async def _dns_resolve(subdomain: str, resolver) -> Tuple[bool, Optional[List[str]]]:
     """
     DNS 解析检查，返回是否存在和 IP 列表
-    
-    需要安装: pip install aiodns
+
+    resolver 为 aiodns.DNSResolver（c-ares 自带进程内缓存）；为 None 表示 aiodns 不可用，
+    此时不做 DNS 过滤，直接交给 HTTP 验证，不再回退到占用线程池的 getaddrinfo。
     返回: (是否存在, IP列表)
     """
     if resolver is None:
-        # 没有 aiodns 时使用内置解析作为兜底，同时尝试获取 IP
-        try:
-            loop = asyncio.get_running_loop()
-            addrs = await asyncio.wait_for(
-                loop.getaddrinfo(subdomain, None, proto=0, type=0, family=0),
-                timeout=2,
-            )
-            ips = list({addr[4][0] for addr in addrs if addr[4]})
-            return (True, ips) if ips else (True, None)
-        except Exception as e:
-            logger.debug("Fallback DNS resolve failed for {}: {}", subdomain, e)
-            return False, None
-    
+        return True, None
+
     try:
         ips = []
-        
-        # 尝试查询 A 记录 (IPv4)
-        try:
-            result = await asyncio.wait_for(resolver.query(subdomain, 'A'), timeout=2)
-            ips.extend([r.host for r in result])
-        except:
-            pass
-        
-        # 尝试查询 AAAA 记录 (IPv6)
-        try:
-            result = await asyncio.wait_for(resolver.query(subdomain, 'AAAA'), timeout=2)
-            ips.extend([r.host for r in result])
-        except:
-            pass
-        
+
+        # A (IPv4) 与 AAAA (IPv6) 并发查询，单个主机的 DNS 耗时取两者较大值而非之和
+        queries = [asyncio.wait_for(resolver.query(subdomain, 'A'), timeout=2)]
+        if ENABLE_IPV6:
+            queries.append(asyncio.wait_for(resolver.query(subdomain, 'AAAA'), timeout=2))
+        results = await asyncio.gather(*queries, return_exceptions=True)
+        for result in results:
+            if not isinstance(result, BaseException):
+                ips.extend([r.host for r in result])
+
         # 如果有任何 IP，说明 DNS 记录存在
         if ips:
             return True, ips
@@ -121,6 +197,102 @@ async def _dns_resolve(subdomain: str, resolver) -> Tuple[bool, Optional[List[st
         return False, None
 
 
+async def _bulk_resolve(
+    run_id: int,
+    domain: str,
+    words: Iterator[str],
+    resolver,
+    wildcard_ips: Optional[frozenset],
+) -> Tuple[List[Tuple[str, Optional[List[str]], bool]], int, int]:
+    """
+    批量 DNS 阶段：以 DNS_CONCURRENCY 并发解析全部候选，只保留存在解析记录的子域。
+
+    泛解析子域仅保留前 WILDCARD_PROBE_LIMIT 个交给 HTTP 阶段。
+    进度只累加在本阶段被过滤掉的候选，存活候选留待 HTTP 阶段处理完再计入，整体进度保持单调。
+    返回: ([(子域, IP列表, 是否泛解析)], 已解析数量, 跳过的泛解析数量)
+    """
+    alive: List[Tuple[str, Optional[List[str]], bool]] = []
+    checked = 0
+    # 已被过滤、可直接计为完成的候选数，以及其中已上报进度的部分
+    settled = 0
+    reported = 0
+    wildcard_probed = 0
+    wildcard_skipped = 0
+    worker_count = max(1, DNS_CONCURRENCY)
+    word_queue: asyncio.Queue = asyncio.Queue(maxsize=worker_count * 2)
+
+    async def produce() -> None:
+        for word in words:
+            if is_stopped(run_id):
+                break
+            await word_queue.put(word)
+        for _ in range(worker_count):
+            await word_queue.put(None)
+
+    async def work() -> None:
+        nonlocal checked, settled, reported, wildcard_probed, wildcard_skipped
+        while True:
+            word = await word_queue.get()
+            if word is None:
+                return
+            if is_stopped(run_id):
+                continue
+            subdomain = f"{word}.{domain}"
+            exists, ips = await _dns_resolve(subdomain, resolver)
+            checked += 1
+            if settled - reported >= RESULT_FLUSH_SIZE:
+                increment_progress(run_id, settled - reported)
+                reported = settled
+            if not exists:
+                settled += 1
+                continue
+
+            # 命中泛解析：只探测前 WILDCARD_PROBE_LIMIT 个，其余视为泛解析结果跳过
+            is_wildcard = bool(wildcard_ips) and ips is not None and frozenset(ips) == wildcard_ips
+            if is_wildcard:
+                if wildcard_probed >= WILDCARD_PROBE_LIMIT:
+                    wildcard_skipped += 1
+                    settled += 1
+                    continue
+                wildcard_probed += 1
+            alive.append((subdomain, ips, is_wildcard))
+
+    await asyncio.gather(produce(), *(work() for _ in range(worker_count)))
+    if settled > reported:
+        increment_progress(run_id, settled - reported)
+    return alive, checked, wildcard_skipped
+
+
+async def _detect_wildcard_ips(domain: str, resolver) -> Optional[frozenset]:
+    """
+    解析两个随机子域；若都能解析且 IP 集合一致，认为目标配置了泛解析并返回该 IP 集合。
+    """
+    if resolver is None:
+        return None
+    samples = []
+    for _ in range(2):
+        exists, ips = await _dns_resolve(f"{uuid.uuid4().hex[:16]}.{domain}", resolver)
+        if not exists or not ips:
+            return None
+        samples.append(frozenset(ips))
+    if samples[0] != samples[1]:
+        return None
+    return samples[0]
+
+
+def _extract_title(content_bytes: bytes) -> Optional[str]:
+    match = HTML_TITLE_RE.search(content_bytes)
+    if match is None:
+        return None
+    return match.group(1).decode('utf-8', 'ignore').strip()[:100] or None
+
+
+def _is_html_content_type(content_type: str) -> bool:
+    """content-type 缺失时视为可能是 HTML。"""
+    mime = content_type.split(';', 1)[0].strip().lower()
+    return not mime or mime in _HTML_CONTENT_TYPES
+
+
 def _extract_peer_ip(response: aiohttp.ClientResponse) -> Optional[str]:
     """从响应连接中提取对端 IP，作为 DNS 结果的补充。"""
     try:
@@ -133,6 +305,32 @@ def _extract_peer_ip(response: aiohttp.ClientResponse) -> Optional[str]:
     return None
 
 
+async def _first_successful(coros: List, failures: Optional[List[Dict]] = None) -> Optional[Tuple[bool, Dict]]:
+    """
+    并发执行多个探测，返回最先成功的结果并取消其余请求；全部失败时返回 None。
+
+    避免已有协议快速响应时仍等待另一协议超时。传入 failures 时，失败尝试的结果字典按完成顺序追加进去。
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled() or task.exception() is not None:
+                    continue
+                ok, details = task.result()
+                if ok:
+                    details.setdefault('detected_by', details.get('method'))
+                    return ok, details
+                if failures is not None:
+                    failures.append(details)
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
 async def _verify_subdomain_http(
     subdomain: str,
     session: aiohttp.ClientSession,
@@ -140,80 +338,79 @@ async def _verify_subdomain_http(
     """
     并行验证子域名HTTP服务
     
-    策略：并行尝试 HTTPS/HTTP HEAD，失败后尝试 OPTIONS 和 GET
+    策略：并行尝试 HTTPS/HTTP HEAD，失败后尝试 OPTIONS 和 GET；每一阶段取最先成功的协议。
+    每次尝试各自返回只含本次响应字段的小字典，只有胜出的结果会补上 subdomain；
+    全部失败时只保留最后一次尝试的错误。
     """
-    details = {
-        'subdomain': subdomain,
-        'method': None,
-        'scheme': None,
-        'status_code': None,
-        'content_type': None,
-        'content_length': None,
-        'server': None,
-        'title': None,
-        'error': None,
-        'response_time': None
-    }
-
+    failures: List[Dict] = []
     try:
-        start_time = dt.datetime.now()
-        
-        # 并行策略：同时尝试 HTTPS 和 HTTP 的 HEAD 请求
-        tasks = [
-            _try_request(session, 'HEAD', f"https://{subdomain}", details.copy(), start_time),
-            _try_request(session, 'HEAD', f"http://{subdomain}", details.copy(), start_time),
-        ]
+        # 单调时钟计算耗时，避免 datetime.now() 的对象分配与时区处理
+        start_time = time.perf_counter()
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # 返回第一个成功的结果
-        for result in results:
-            if not isinstance(result, Exception) and result[0]:
-                result[1].setdefault('detected_by', result[1].get('method'))
-                return result
+        # 并行策略：同时尝试 HTTPS 和 HTTP 的 HEAD 请求，任一成功即返回
+        result = await _first_successful([
+            _try_request(session, 'HEAD', 'https', subdomain, start_time),
+            _try_request(session, 'HEAD', 'http', subdomain, start_time),
+        ], failures)
 
         # 如果 HEAD 都失败，尝试 OPTIONS
-        tasks = [
-            _try_request(session, 'OPTIONS', f"https://{subdomain}", details.copy(), start_time),
-            _try_request(session, 'OPTIONS', f"http://{subdomain}", details.copy(), start_time),
-        ]
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        for result in results:
-            if not isinstance(result, Exception) and result[0]:
-                result[1].setdefault('detected_by', result[1].get('method'))
-                return result
+        if not result:
+            result = await _first_successful([
+                _try_request(session, 'OPTIONS', 'https', subdomain, start_time),
+                _try_request(session, 'OPTIONS', 'http', subdomain, start_time),
+            ], failures)
 
         # 最后尝试受限的 GET
-        if ENABLE_GET_FALLBACK:
-            tasks = [
-                _try_limited_get(session, f"https://{subdomain}", details.copy(), start_time),
-                _try_limited_get(session, f"http://{subdomain}", details.copy(), start_time),
-            ]
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for result in results:
-                if not isinstance(result, Exception) and result[0]:
-                    result[1].setdefault('detected_by', result[1].get('method'))
-                    return result
-
-        return False, details
+        if not result and ENABLE_GET_FALLBACK:
+            result = await _first_successful([
+                _try_limited_get(session, 'https', subdomain, start_time),
+                _try_limited_get(session, 'http', subdomain, start_time),
+            ], failures)
+
+        if result:
+            result[1]['subdomain'] = subdomain
+            return result
+
+        failed = {'subdomain': subdomain}
+        if failures:
+            last = failures[-1]
+            failed['error'] = last.get('error') or f"invalid_status: {last.get('status_code')}"
+        return False, failed
 
     except Exception as e:
-        details['error'] = str(e)
-        return False, details
+        return False, {'subdomain': subdomain, 'error': str(e)}
+
+
+def _response_fields(response: aiohttp.ClientResponse, start_time: float) -> Dict:
+    """提取一次响应的公共字段"""
+    return {
+        'status_code': response.status,
+        'content_type': response.headers.get('content-type', ''),
+        'content_length': response.headers.get('content-length', ''),
+        'server': response.headers.get('server', ''),
+        'response_time': time.perf_counter() - start_time,
+    }
+
+
+def _add_peer_ip(details: Dict, response: aiohttp.ClientResponse) -> None:
+    """将响应连接的对端 IP 记入 details"""
+    peer_ip = _extract_peer_ip(response)
+    if peer_ip:
+        details.setdefault('ip', peer_ip)
+        ips = details.setdefault('ips', [])
+        if peer_ip not in ips:
+            ips.append(peer_ip)
 
 
 async def _try_request(
     session: aiohttp.ClientSession,
     method: str,
-    url: str,
-    details: Dict,
-    start_time: dt.datetime
+    scheme: str,
+    host: str,
+    start_time: float
 ) -> Tuple[bool, Dict]:
-    """尝试单个HTTP请求"""
+    """尝试单个HTTP请求，返回本次尝试的结果字典"""
+    url = f"{scheme}://{host}"
     try:
         async with session.request(
             method=method,
@@ -221,47 +418,40 @@ async def _try_request(
             allow_redirects=False,
             timeout=ClientTimeout(total=3)
         ) as response:
-            details.update({
-                'method': method,
-                'scheme': urlparse(url).scheme,
-                'status_code': response.status,
-                'content_type': response.headers.get('content-type', ''),
-                'content_length': response.headers.get('content-length', ''),
-                'server': response.headers.get('server', ''),
-                'response_time': (dt.datetime.now() - start_time).total_seconds()
-            })
+            result = _response_fields(response, start_time)
+            result['method'] = method
+            result['scheme'] = scheme
 
             if _is_valid_response(response.status):
-                details.setdefault('detected_by', details.get('method'))
-                peer_ip = _extract_peer_ip(response)
-                if peer_ip:
-                    details.setdefault('ip', peer_ip)
-                    details.setdefault('ips', [])
-                    if peer_ip not in details['ips']:
-                        details['ips'].append(peer_ip)
-                return True, details
+                result['detected_by'] = method
+                _add_peer_ip(result, response)
+                return True, result
 
-            return False, details
+            return False, result
 
     except asyncio.TimeoutError:
-        details['error'] = 'timeout'
+        return False, {'error': 'timeout'}
     except aiohttp.ClientConnectorError:
-        details['error'] = 'connection_refused'
+        return False, {'error': 'connection_refused'}
     except aiohttp.ClientError as e:
-        details['error'] = f'http_error: {type(e).__name__}'
+        return False, {'error': f'http_error: {type(e).__name__}'}
     except Exception as e:
-        details['error'] = f'unknown_error: {type(e).__name__}'
-
-    return False, details
+        return False, {'error': f'unknown_error: {type(e).__name__}'}
 
 
 async def _try_limited_get(
     session: aiohttp.ClientSession,
-    url: str,
-    details: Dict,
-    start_time: dt.datetime
+    scheme: str,
+    host: str,
+    start_time: float
 ) -> Tuple[bool, Dict]:
-    """有限制的GET请求，只下载少量数据；缺失标题时会尝试一次无 Range 的兜底 GET。"""
+    """
+    有限制的GET请求，只下载少量数据。
+
+    仅当首个响应是 206 分段、内容为 HTML、且采样数据中既没有标题也没有 </head> 时，
+    才会再做一次无 Range 的兜底 GET。
+    """
+    url = f"{scheme}://{host}"
     try:
         headers = {'Range': f'bytes=0-{MAX_RESPONSE_SIZE-1}'}
 
@@ -273,101 +463,86 @@ async def _try_limited_get(
             timeout=ClientTimeout(total=3)
         ) as response:
 
-            details.update({
+            result = _response_fields(response, start_time)
+            result.update({
                 'method': 'GET(limited)',
-                'scheme': urlparse(str(response.url)).scheme,
-                'status_code': response.status,
-                'content_type': response.headers.get('content-type', ''),
-                'content_length': response.headers.get('content-length', ''),
-                'server': response.headers.get('server', ''),
-                'response_time': (dt.datetime.now() - start_time).total_seconds(),
+                # 仅在发生跳转时才读取最终 URL 的 scheme
+                'scheme': response.url.scheme if response.history else scheme,
                 'final_url': str(response.url),
                 'redirected': bool(response.history),
             })
 
             if _is_valid_response(response.status):
-                details.setdefault('detected_by', details.get('method'))
-                peer_ip = _extract_peer_ip(response)
-                if peer_ip:
-                    details.setdefault('ip', peer_ip)
-                    details.setdefault('ips', [])
-                    if peer_ip not in details['ips']:
-                        details['ips'].append(peer_ip)
+                result['detected_by'] = result['method']
+                _add_peer_ip(result, response)
 
                 # 尝试解析 title（即使 content-type 缺失也尝试）
                 title_found = False
+                saw_head_close = False
+                is_partial = response.status == 206
+                content_bytes = b''
                 try:
                     content_bytes = await response.content.read(MAX_RESPONSE_SIZE)
-                    details['sampled_bytes'] = len(content_bytes)
-                    content = content_bytes.decode('utf-8', errors='ignore')
-                    lower = content.lower()
-                    if '<title>' in lower:
-                        start = lower.find('<title>') + 7
-                        end = lower.find('</title>', start)
-                        if start > 6 and end > start:
-                            details['title'] = content[start:end].strip()[:100]
-                            title_found = True
+                    result['sampled_bytes'] = len(content_bytes)
+                    saw_head_close = HTML_HEAD_CLOSE_RE.search(content_bytes) is not None
+                    title = _extract_title(content_bytes)
+                    if title:
+                        result['title'] = title
+                        title_found = True
                 except Exception:
                     pass
 
-                # 如果未拿到标题，额外做一次无 Range 的兜底 GET（仍限制读取大小）
-                if not title_found and response.status < 400:
+                # 服务端按 Range 截断且 <head> 尚未结束时，额外做一次无 Range 的兜底 GET（仍限制读取大小）
+                if (
+                    not title_found
+                    and not saw_head_close
+                    and is_partial
+                    and _is_html_content_type(result['content_type'])
+                ):
                     try:
                         async with session.get(
                             url=url,
                             allow_redirects=True,
                             timeout=ClientTimeout(total=4)
                         ) as resp2:
-                            details.update({
-                                'status_code': resp2.status,
-                                'scheme': urlparse(str(resp2.url)).scheme,
-                                'content_type': resp2.headers.get('content-type', ''),
-                                'content_length': resp2.headers.get('content-length', ''),
-                                'server': resp2.headers.get('server', details.get('server', '')),
-                                'response_time': (dt.datetime.now() - start_time).total_seconds(),
+                            server = result['server']
+                            result.update(_response_fields(resp2, start_time))
+                            result.update({
+                                'scheme': resp2.url.scheme if resp2.history else scheme,
+                                'server': result['server'] or server,
                                 'final_url': str(resp2.url),
                                 'redirected': bool(resp2.history),
                             })
-                            peer_ip2 = _extract_peer_ip(resp2)
-                            if peer_ip2:
-                                details.setdefault('ip', peer_ip2)
-                                details.setdefault('ips', [])
-                                if peer_ip2 not in details['ips']:
-                                    details['ips'].append(peer_ip2)
+                            _add_peer_ip(result, resp2)
 
                             content_bytes = await resp2.content.read(MAX_RESPONSE_SIZE)
-                            details['sampled_bytes'] = len(content_bytes)
-                            content = content_bytes.decode('utf-8', errors='ignore')
-                            lower = content.lower()
-                            if '<title>' in lower:
-                                start = lower.find('<title>') + 7
-                                end = lower.find('</title>', start)
-                                if start > 6 and end > start:
-                                    details['title'] = content[start:end].strip()[:100]
-                                    title_found = True
+                            result['sampled_bytes'] = len(content_bytes)
+                            title = _extract_title(content_bytes)
+                            if title:
+                                result['title'] = title
+                                title_found = True
                     except Exception:
                         pass
                 if not title_found:
                     # 带上调试信息，方便日志排查
-                    details['title_debug'] = f"no <title> in first {details.get('sampled_bytes','?')} bytes; ct={details.get('content_type','')}; url={details.get('final_url','')}"
+                    result['title_debug'] = f"no <title> in first {result.get('sampled_bytes','?')} bytes; ct={result.get('content_type','')}; url={result.get('final_url','')}"
                     # 仅在 debug 级别输出截断的正文内容
                     logger.debug(
                         "No <title> for {} {} ct={} sampled={} url={} body='{}'",
                         url,
                         response.status,
-                        details.get('content_type'),
-                        details.get('sampled_bytes'),
-                        details.get('final_url'),
-                        _safe_snippet(content if 'content' in locals() else ""),
+                        result.get('content_type'),
+                        result.get('sampled_bytes'),
+                        result.get('final_url'),
+                        _safe_snippet(content_bytes.decode('utf-8', errors='ignore')),
                     )
 
-                return True, details
+                return True, result
 
-            return False, details
+            return False, result
 
     except Exception as e:
-        details['error'] = f'get_error: {type(e).__name__}'
-        return False, details
+        return False, {'error': f'get_error: {type(e).__name__}'}
 
 
 async def _enrich_with_get(
@@ -378,23 +553,32 @@ async def _enrich_with_get(
     """
     对已确认存活的子域再发起一次受限 GET，提取状态码和 title。
     避免对未存活的目标重复请求，减小负载。
+
+    仅在开启 ENABLE_TITLE_FETCH 且响应可能为 HTML 时执行；同一 session 的保活连接会被复用。
     """
+    if not ENABLE_TITLE_FETCH:
+        return details
     if details.get('method', '').upper().startswith('GET'):
         return details
+    if not _is_html_content_type(details.get('content_type') or ''):
+        return details
 
-    detected_by = details.get('detected_by', details.get('method'))
     scheme = details.get('scheme') or 'https'
-    ok, enriched = await _try_limited_get(
-        session,
-        f"{scheme}://{subdomain}",
-        details.copy(),
-        dt.datetime.now()
-    )
-    if ok:
-        enriched['detected_by'] = detected_by
-        return enriched
+    ok, enriched = await _try_limited_get(session, scheme, subdomain, time.perf_counter())
+    if not ok:
+        return details
 
-    details['detected_by'] = detected_by
+    # GET 结果覆盖 HEAD/OPTIONS 的字段，但保留最初的探测方式和对端 IP
+    ips = details.get('ips') or []
+    for ip in enriched.pop('ips', []):
+        if ip not in ips:
+            ips.append(ip)
+    if details.get('ip'):
+        enriched.pop('ip', None)
+    enriched['detected_by'] = details.get('detected_by', details.get('method'))
+    details.update(enriched)
+    if ips:
+        details['ips'] = ips
     return details
 
 
@@ -402,38 +586,117 @@ def _is_valid_response(status_code: int) -> bool:
     """判断HTTP状态码是否表示有效的HTTP服务"""
     if 200 <= status_code < 400:
         return True
-
-    valid_4xx = {
-        400, 401, 403, 404, 405, 406, 407, 408, 409, 410,
-        411, 412, 413, 414, 415, 416, 417, 418, 421, 422,
-        423, 424, 425, 426, 428, 429, 431, 451,
-    }
-
-    return status_code in valid_4xx
-
-
-async def _update_run(
-    session: AsyncSession,
-    run: SubdomainRun,
+    return 0 <= status_code < 512 and bool((_VALID_4XX_MASK >> status_code) & 1)
+
+
+def _format_found_log(subdomain: str, details: Dict) -> str:
+    """格式化单个存活子域的日志行。"""
+    info = f"✅ {subdomain}"
+    info += f" [{details['method']} {details['scheme']} {details['status_code']}]"
+    if details.get('response_time'):
+        info += f" ({details['response_time']:.2f}s)"
+    if details.get('ips'):
+        ips_str = ', '.join(details['ips'][:3])  # 最多显示3个IP
+        if len(details['ips']) > 3:
+            ips_str += f" +{len(details['ips'])-3}..."
+        info += f" IP:[{ips_str}]"
+    if details.get('server'):
+        info += f" - {details['server'][:30]}"
+    if details.get('title'):
+        info += f" - {details['title'][:50]}"
+    elif details.get('title_debug'):
+        info += f" - 无标题({details['title_debug'][:120]})"
+    return info
+
+
+@dataclass
+class _RunState:
+    """暂存待写入的运行状态，按批次统一提交，避免每条日志都触发一次 commit。"""
+
+    status: Optional[str] = None
+    log_lines: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    started_at: Optional[dt.datetime] = None
+    finished_at: Optional[dt.datetime] = None
+
+
+def _queue_run_update(
+    state: _RunState,
     *,
     status: Optional[str] = None,
     log_line: Optional[str] = None,
     error: Optional[str] = None,
     finished: bool = False,
 ) -> None:
+    """仅修改内存中的 _RunState，不访问数据库。"""
     if status:
-        run.status = status
+        state.status = status
+        if status == "running" and state.started_at is None:
+            state.started_at = dt.datetime.now(dt.timezone.utc)
     if log_line:
-        run.log_snippet = _append_log(run.log_snippet, log_line)
+        state.log_lines.append(log_line)
     if error:
-        run.error_message = error
-    if run.started_at is None and status == "running":
-        run.started_at = dt.datetime.now(dt.timezone.utc)
+        state.error = error
     if finished:
-        run.finished_at = dt.datetime.now(dt.timezone.utc)
+        state.finished_at = dt.datetime.now(dt.timezone.utc)
+
+
+async def _flush_run(session: AsyncSession, run: SubdomainRun, state: _RunState) -> None:
+    """将累积的状态一次性写入 run，并与同一事务内的其他写入（如子域结果）一起提交。"""
+    if state.status:
+        run.status = state.status
+    if state.log_lines:
+        buffer = _get_log_buffer(run)
+        for entry in state.log_lines:
+            buffer.extend(entry.splitlines())
+        run.log_snippet = "\n".join(buffer)[-LOG_LIMIT:]
+    if state.error:
+        run.error_message = state.error
+    if run.started_at is None and state.started_at is not None:
+        run.started_at = state.started_at
+    if state.finished_at is not None:
+        run.finished_at = state.finished_at
     session.add(run)
     await session.commit()
-    await session.refresh(run)
+
+    if state.finished_at is not None:
+        _release_run_log(run.id)
+    state.status = None
+    state.log_lines.clear()
+    state.error = None
+    state.started_at = None
+    state.finished_at = None
+
+
+def _iter_words(path: str) -> Iterator[str]:
+    """
+    逐行产出字典中的候选词，跳过空行与 # 注释。
+
+    统一转小写、去掉末尾的点，丢弃非法 DNS 标签并去重，避免无效条目浪费 DNS 查询。
+    """
+    seen: Set[str] = set()
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            word = line.strip()
+            if not word or word.startswith('#'):
+                continue
+            word = word.lower().rstrip('.')
+            if word in seen or not LABEL_RE.match(word):
+                continue
+            seen.add(word)
+            yield word
+
+
+def _count_words(path: str) -> int:
+    return sum(1 for _ in _iter_words(path))
+
+
+# 各类型默认字典的路径缓存；默认字典很少变化，由切换默认/删除字典的接口负责失效
+_default_wordlist_paths: Dict[str, str] = {}
+
+
+def _invalidate_default_wordlist_cache() -> None:
+    _default_wordlist_paths.clear()
 
 
 async def _ensure_wordlist(
@@ -443,29 +706,36 @@ async def _ensure_wordlist(
     expected_type: str = DEFAULT_WORDLIST_TYPE,
 ) -> Optional[str]:
     if wordlist_id is None:
+        cached = _default_wordlist_paths.get(expected_type)
+        if cached is not None:
+            return cached
         stmt = (
-            select(Wordlist)
+            select(Wordlist.path)
             .where(Wordlist.is_default.is_(True), Wordlist.type == expected_type)
             .limit(1)
         )
-        result = await session.exec(stmt)
-        wordlist = result.first()
-    else:
-        stmt = select(Wordlist).where(
-            Wordlist.id == wordlist_id, Wordlist.type == expected_type
-        )
-        result = await session.exec(stmt)
-        wordlist = result.first()
-    if wordlist is None:
-        return None
-    return wordlist.path
+        path = await session.scalar(stmt)
+        # 只缓存命中结果，尚无默认字典时下次仍会查询
+        if path is not None:
+            _default_wordlist_paths[expected_type] = path
+        return path
+    stmt = select(Wordlist.path).where(
+        Wordlist.id == wordlist_id, Wordlist.type == expected_type
+    )
+    return await session.scalar(stmt)
 
 
 async def run_http_enumerator(
-    session: AsyncSession, run_id: int, domain: str, wordlist_id: Optional[int]
+    session: AsyncSession,
+    run_id: int,
+    domain: str,
+    wordlist_id: Optional[int],
+    state: Optional[_RunState] = None,
 ) -> None:
     """
     高效HTTP子域名枚举器主函数
+
+    `state` 可携带调用方尚未提交的日志，与本函数的首次写入合并提交。
     """
     run = await session.get(SubdomainRun, run_id)
     if run is None:
@@ -473,17 +743,21 @@ async def run_http_enumerator(
     if is_stopped(run_id):
         return
 
+    if state is None:
+        state = _RunState()
+
     wordlist_path = await _ensure_wordlist(session, wordlist_id)
     if not wordlist_path:
-        await _update_run(
-            session, run,
+        _queue_run_update(
+            state,
             status="failed",
             error="未找到可用的字典文件",
             finished=True
         )
+        await _flush_run(session, run, state)
         return
 
-    await _update_run(session, run, status="running")
+    _queue_run_update(state, status="running")
 
     try:
         ssl_context = _get_ssl_context()
@@ -492,6 +766,10 @@ async def run_http_enumerator(
             limit=MAX_CONCURRENT_REQUESTS,
             ttl_dns_cache=300,
             use_dns_cache=True,
+            force_close=False,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True,
+            socket_factory=_tuned_socket,
         )
         client_timeout = ClientTimeout(
             total=REQUEST_TIMEOUT,
@@ -499,44 +777,84 @@ async def run_http_enumerator(
             sock_read=2
         )
 
-        # 读取字典
-        with open(wordlist_path, 'r', encoding='utf-8', errors='ignore') as f:
-            words = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        # 字典按行流式读取，不再整体载入内存；总数在线程中预先统计一遍用于进度
+        total_words = await asyncio.to_thread(_count_words, wordlist_path)
 
-        set_progress(run_id, len(words), 0)
+        set_progress(run_id, total_words, 0)
 
-        await _update_run(
-            session, run,
-            log_line=f"🚀 启动HTTP枚举器：{len(words)} 个候选子域名"
+        _queue_run_update(
+            state,
+            log_line=f"🚀 启动HTTP枚举器：{total_words} 个候选子域名"
         )
-        await _update_run(
-            session, run,
-            log_line=f"⚡ 配置：并发={MAX_CONCURRENT_REQUESTS}, 超时={REQUEST_TIMEOUT}s, DNS预检查=启用"
+        _queue_run_update(
+            state,
+            log_line=f"⚡ 配置：HTTP并发={MAX_CONCURRENT_REQUESTS}, DNS并发={DNS_CONCURRENCY}, 超时={REQUEST_TIMEOUT}s"
         )
-        await _update_run(
-            session, run,
-            log_line=f"🎯 策略：DNS解析 → 并行 HEAD(HTTPS+HTTP) → OPTIONS → GET(受限)"
+        _queue_run_update(
+            state,
+            log_line=f"🎯 策略：批量DNS解析 → 并行 HEAD(HTTPS+HTTP) → OPTIONS → GET(受限)"
         )
 
-        # 初始化 DNS 解析器
+        # 初始化 DNS 解析器：DNSResolver 绑定当前事件循环且非线程安全，
+        # 每个运行只创建一个实例，在整个运行内复用
         dns_resolver = None
-        try:
-            import aiodns
+        if aiodns is not None:
             dns_resolver = aiodns.DNSResolver(timeout=DNS_TIMEOUT, tries=DNS_RETRIES)
-            await _update_run(
-                session, run,
+            _queue_run_update(
+                state,
                 log_line=f"🔍 DNS解析器已启用，将先过滤不存在的域名"
             )
-        except ImportError:
-            await _update_run(
-                session, run,
+        else:
+            _queue_run_update(
+                state,
                 log_line=f"⚠️  未安装 aiodns，跳过 DNS 预检查 (pip install aiodns)"
             )
-            logger.info("aiodns not installed, skip DNS pre-check")
+            logger.warning("aiodns not installed, skip DNS pre-check")
+
+        wildcard_ips = await _detect_wildcard_ips(domain, dns_resolver)
+        if wildcard_ips:
+            _queue_run_update(
+                state,
+                log_line=(
+                    f"🃏 检测到泛解析：{', '.join(sorted(wildcard_ips))}，"
+                    f"仅探测前 {WILDCARD_PROBE_LIMIT} 个指向该 IP 的子域"
+                )
+            )
+
+        # 启动信息统一提交一次，便于前端尽快看到 running 状态
+        await _flush_run(session, run, state)
 
-        # 创建信号量控制并发
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
         found_domains: Set[str] = set()
+        total_found = 0
+        wildcard_skipped = 0
+        dns_dropped = 0
+
+        # 第一阶段：批量 DNS 解析，只把有解析记录的子域交给 HTTP 阶段；
+        # DNS 与 HTTP 分别使用各自合适的并发度，内存占用取决于存活子域数量
+        if dns_resolver is not None:
+            alive, dns_checked, wildcard_skipped = await _bulk_resolve(
+                run_id,
+                domain,
+                _iter_words(wordlist_path),
+                dns_resolver,
+                wildcard_ips,
+            )
+            dropped_pct = (dns_checked - len(alive)) / dns_checked * 100 if dns_checked else 0.0
+            dns_dropped = dns_checked - len(alive) - wildcard_skipped
+            _queue_run_update(
+                state,
+                log_line=(
+                    f"🔍 DNS过滤：{dns_checked:,} → {len(alive):,} 个候选"
+                    f"（丢弃 {dropped_pct:.1f}%）"
+                )
+            )
+            await _flush_run(session, run, state)
+            # 进度总数保持为全部候选：被过滤的候选已在 DNS 阶段计为完成，HTTP 阶段只累加存活候选
+            total_candidates = len(alive)
+            candidates = iter(alive)
+        else:
+            total_candidates = total_words
+            candidates = ((f"{word}.{domain}", None, False) for word in _iter_words(wordlist_path))
 
         # ✅ 关键修复：将所有使用 session 的代码放在 async with 块内
         async with aiohttp.ClientSession(
@@ -545,158 +863,177 @@ async def run_http_enumerator(
             headers={'User-Agent': USER_AGENT}
         ) as client_session:
 
-            async def check_subdomain(word: str) -> Optional[Tuple[str, Dict]]:
-                subdomain = f"{word}.{domain}"
-
-                # 第一步：DNS 预检查
-                dns_exists, ips = await _dns_resolve(subdomain, dns_resolver)
-                
-                if not dns_exists:
-                    # DNS 不存在，直接跳过
-                    return None
-
-                # 第二步：HTTP 验证
-                async with semaphore:
-                    is_valid, details = await _verify_subdomain_http(subdomain, client_session)
-
-                    if is_valid and subdomain not in found_domains:
-                        found_domains.add(subdomain)
-                        # 已确认存活后再进行一次受限 GET 获取标题/状态码等详情
-                        details = await _enrich_with_get(client_session, subdomain, details)
-                        
-                        # 将 DNS 信息添加到 metadata
-                        if ips:
-                            details['ips'] = ips
-                        # 若 HTTP 连接提取到了对端 IP 也附加上
-                        if details.get('ip'):
-                            details.setdefault('ips', [])
-                            if details['ip'] not in details['ips']:
-                                details['ips'].append(details['ip'])
-                        
-                        return subdomain, details
-
-                    return None
-
-            # 批量处理
-            batch_size = 200
-            total_found = 0
-            total_dns_filtered = 0
-
-            for i in range(0, len(words), batch_size):
-                if is_stopped(run_id):
-                    clear_progress(run_id)
-                    await _update_run(
-                        session, run,
-                        status="canceled",
-                        finished=True,
-                        log_line="⏹ 任务已被用户停止"
-                    )
-                    return
-
-                batch = words[i:i + batch_size]
-                batch_num = i // batch_size + 1
-                total_batches = (len(words) + batch_size - 1) // batch_size
-
-                await _update_run(
-                    session, run,
-                    log_line=f"📦 处理批次 {batch_num}/{total_batches}: {len(batch)} 个候选域名"
-                )
-                logger.info(
-                    "Processing batch {}/{} (size={}) for domain={}",
-                    batch_num,
-                    total_batches,
-                    len(batch),
-                    domain,
-                )
-
-                # 并发验证当前批次
-                tasks = [check_subdomain(word) for word in batch]
-                batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # 批量处理结果
-                batch_found = 0
-                batch_subdomains: List[Subdomain] = []
-                batch_logs: List[str] = []
-
-                for result in batch_results:
-                    if isinstance(result, Exception):
-                        logger.warning("Check subdomain failed: {}", result)
+            async def check_subdomain(
+                subdomain: str,
+                ips: Optional[List[str]],
+                is_wildcard: bool,
+            ) -> Optional[Tuple[str, Dict]]:
+                # 第二阶段：HTTP 验证（并发由 worker 数量控制）
+                is_valid, details = await _verify_subdomain_http(subdomain, client_session)
+
+                if is_valid and subdomain not in found_domains:
+                    found_domains.add(subdomain)
+                    # 已确认存活后再进行一次受限 GET 获取标题/状态码等详情
+                    details = await _enrich_with_get(client_session, subdomain, details)
+                    
+                    # 将 DNS 信息添加到 metadata
+                    if ips:
+                        details['ips'] = ips
+                    if is_wildcard:
+                        details['wildcard'] = True
+                    # 若 HTTP 连接提取到了对端 IP 也附加上
+                    if details.get('ip'):
+                        details.setdefault('ips', [])
+                        if details['ip'] not in details['ips']:
+                            details['ips'].append(details['ip'])
+                    
+                    return subdomain, details
+
+                return None
+
+            # 流水线：producer 投递候选子域 → N 个 worker 并发验证 → 单个 writer 批量入库
+            # worker 数量即并发上限；writer 是唯一使用数据库 session 的协程
+            worker_count = max(1, MAX_CONCURRENT_REQUESTS)
+            word_queue: asyncio.Queue = asyncio.Queue(maxsize=worker_count * 2)
+            # 有界结果队列：writer 入库变慢时 worker 在 put 处等待形成背压，积压结果不会无限占用内存
+            result_queue: asyncio.Queue = asyncio.Queue(maxsize=RESULT_QUEUE_SIZE)
+
+            async def produce() -> None:
+                for candidate in candidates:
+                    if is_stopped(run_id):
+                        break
+                    await word_queue.put(candidate)
+                for _ in range(worker_count):
+                    await word_queue.put(None)
+
+            async def work() -> None:
+                while True:
+                    candidate = await word_queue.get()
+                    if candidate is None:
+                        return
+                    if is_stopped(run_id):
+                        # 停止后快速排空队列，避免 producer 阻塞
                         continue
-
-                    if result:
-                        subdomain, details = result
-                        batch_found += 1
-                        total_found += 1
-
-                        # 格式化日志
-                        info = f"✅ {subdomain}"
-                        info += f" [{details['method']} {details['scheme']} {details['status_code']}]"
-                        if details.get('response_time'):
-                            info += f" ({details['response_time']:.2f}s)"
-                        if details.get('ips'):
-                            ips_str = ', '.join(details['ips'][:3])  # 最多显示3个IP
-                            if len(details['ips']) > 3:
-                                ips_str += f" +{len(details['ips'])-3}..."
-                            info += f" IP:[{ips_str}]"
-                        if details.get('server'):
-                            info += f" - {details['server'][:30]}"
-                        if details.get('title'):
-                            info += f" - {details['title'][:50]}"
-                        elif details.get('title_debug'):
-                            info += f" - 无标题({details['title_debug'][:120]})"
-
-                        batch_logs.append(info)
-
-                        batch_subdomains.append(
-                            Subdomain(
-                                run_id=run.id,
-                                host=subdomain,
-                                source="http_enumerator",
-                                metadata_json=json.dumps(details, ensure_ascii=False, separators=(',', ':'))
-                            )
+                    try:
+                        result = await check_subdomain(*candidate)
+                    except Exception as e:
+                        logger.warning("Check subdomain failed: {}", e)
+                        result = None
+                    await result_queue.put(result)
+
+            async def run_workers() -> None:
+                await asyncio.gather(*(work() for _ in range(worker_count)))
+                await result_queue.put(_PIPELINE_DONE)
+
+            async def write_results() -> None:
+                nonlocal total_found
+                loop = asyncio.get_running_loop()
+                pending_rows: List[Dict] = []
+                pending_logs: List[str] = []
+                pending_processed = 0
+                processed_total = 0
+                last_flush = loop.time()
+
+                async def flush() -> None:
+                    nonlocal pending_processed, processed_total, last_flush
+                    if pending_logs:
+                        _queue_run_update(state, log_line="\n".join(pending_logs))
+                        _queue_run_update(
+                            state,
+                            log_line=f"📈 新发现 {len(pending_logs)} 个子域名，总计 {total_found}"
                         )
+                    if pending_rows:
+                        # Core executemany + OR IGNORE：跳过 ORM 单元工作，重复的 (run_id, host) 直接忽略
+                        await session.execute(_SUBDOMAIN_INSERT, pending_rows)
+                    if pending_rows or state.log_lines:
+                        await _flush_run(session, run, state)
+                    if pending_processed:
+                        # 进度在入库提交之后一次性累加，只有 writer 会写入，
+                        # 属于尽力而为的统计，最多滞后一个批次
+                        increment_progress(run_id, pending_processed)
+                        processed_total += pending_processed
+                        logger.info(
+                            "Processed {}/{} candidates for domain={}",
+                            processed_total,
+                            total_candidates,
+                            domain,
+                        )
+                    pending_rows.clear()
+                    pending_logs.clear()
+                    pending_processed = 0
+                    last_flush = loop.time()
 
-                # 批量写入日志和数据库
-                if batch_logs:
-                    await _update_run(session, run, log_line="\n".join(batch_logs))
-
-                if batch_subdomains:
-                    session.add_all(batch_subdomains)
+                while True:
+                    timeout = max(0.0, RESULT_FLUSH_INTERVAL - (loop.time() - last_flush))
                     try:
-                        await session.commit()
-                    except IntegrityError:
-                        await session.rollback()
-                        logger.opt(exception=True).warning("Integrity error while saving batch, rolled back")
-
-                if batch_found > 0:
-                    await _update_run(
-                        session, run,
-                        log_line=f"📈 本批次发现 {batch_found} 个子域名，总计 {total_found}"
-                    )
-
-                increment_progress(run_id, len(batch))
+                        item = await asyncio.wait_for(result_queue.get(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        item = None
+                    else:
+                        if item is _PIPELINE_DONE:
+                            break
+                        pending_processed += 1
+
+                    if item:
+                        subdomain, details = item
+                        total_found += 1
+                        pending_logs.append(_format_found_log(subdomain, details))
+                        # title_debug 只用于日志，不写入 metadata
+                        details.pop('title_debug', None)
+                        pending_rows.append({
+                            'run_id': run.id,
+                            'host': subdomain,
+                            'source': "http_enumerator",
+                            'metadata': orjson.dumps(details).decode(),
+                            'created_at': dt.datetime.now(dt.timezone.utc),
+                        })
+
+                    if (
+                        pending_processed >= RESULT_FLUSH_SIZE
+                        or loop.time() - last_flush >= RESULT_FLUSH_INTERVAL
+                    ):
+                        await flush()
+
+                await flush()
+
+            await asyncio.gather(produce(), run_workers(), write_results())
+
+            if is_stopped(run_id):
+                clear_progress(run_id)
+                _queue_run_update(
+                    state,
+                    status="canceled",
+                    finished=True,
+                    log_line=None if _stop_logged(run_id) else _STOP_LOG_LINE
+                )
+                await _flush_run(session, run, state)
+                return
 
         # 完成
         clear_progress(run_id)
         
         summary = f"🎉 HTTP枚举完成！总计发现 {total_found} 个真实可访问的子域名"
-        if dns_resolver:
-            summary += f"\n🔍 DNS预检查已过滤大量无效域名"
+        if dns_dropped:
+            summary += f"\n🔍 DNS预检查过滤掉 {dns_dropped} 个无效域名"
+        if wildcard_skipped:
+            summary += f"\n🃏 跳过 {wildcard_skipped} 个仅命中泛解析的子域"
         
-        await _update_run(
-            session, run,
+        _queue_run_update(
+            state,
             status="succeeded",
             finished=True,
             log_line=summary
         )
+        await _flush_run(session, run, state)
         clear_stop(run_id)
 
     except Exception as e:
         clear_progress(run_id)
         clear_stop(run_id)
-        await _update_run(
-            session, run,
+        _queue_run_update(
+            state,
             status="failed",
             error=f"HTTP枚举器错误: {str(e)}",
             finished=True
         )
+        await _flush_run(session, run, state)
@@ -1,73 +1,312 @@
 from __future__ import annotations
 
+import atexit
+import inspect
 import logging
 import os
+import random
 import sys
-from typing import Any
+import threading
+from typing import Any, Callable, TextIO
 
 from loguru import logger
 
+# 日志级别只在导入时解析一次，供标准 logging 与 loguru 共用
+LOG_LEVEL = sys.intern(os.getenv("LOG_LEVEL", "INFO").upper())
+# uvicorn 访问日志每个请求一条：LOG_ACCESS=0 时在源头禁用，
+# LOG_ACCESS_SAMPLE_RATE 小于 1 时按比例随机抽样保留
+LOG_ACCESS = os.getenv("LOG_ACCESS", "1") != "0"
+LOG_ACCESS_SAMPLE_RATE = float(os.getenv("LOG_ACCESS_SAMPLE_RATE", "1"))
+
+# logging 模块源文件路径，用于跳过其内部栈帧
+_LOGGING_FILE = logging.__file__
+
+# 标准 logging 级别名 -> loguru 级别（名称或数值），首次解析后缓存
+_LEVEL_CACHE: dict[str, str | int] = {}
+# setup_logging 时快照的 loguru 已注册级别名，用成员判断代替异常控制流
+_LEVEL_NAMES: frozenset[str] = frozenset()
+
+# loguru sink 的最低级别数值，由 setup_logging 设置；低于该级别的记录在 emit 开头直接丢弃
+_MIN_LEVEL_NO = 0
+
+# 仅打印时间 + level + 文件名:行号。使用静态格式串：loguru（>=0.7）在 add() 时一次性
+# 解析颜色标记并预编译时间格式，逐条记录只做 str.format；改用回调函数反而要逐条解析标记
+# 文件名列由 _patch_file 预先截断/补齐为 18 个字符
+_LOG_FORMAT = (
+    "<green>{time:HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{extra[file18]}</cyan>:<cyan>{line:>4}</cyan> - <level>{message}</level>"
+)
+# 不着色时使用不含颜色标记的同款格式，省去标记的解析与剥离
+_PLAIN_LOG_FORMAT = "{time:HH:mm:ss.SSS} | {level: <8} | {extra[file18]}:{line:>4} - {message}"
+
+# 由 setup_logging 接管的标准 logger 及其级别，None 表示跟随 LOG_LEVEL
+_MANAGED_LOGGERS: tuple[tuple[str, str | None], ...] = (
+    # 统一 uvicorn/fastapi
+    ("uvicorn", None),
+    ("uvicorn.error", None),
+    ("uvicorn.access", None),
+    ("fastapi", None),
+    # 降噪 SQL 日志：只在 WARNING 以上输出
+    ("sqlalchemy.engine", "WARNING"),
+    ("sqlalchemy.pool", "WARNING"),
+    ("aiosqlite", "WARNING"),
+)
+
+# 源文件路径 -> 定宽文件名，每个源文件只计算一次
+_FILE_NAME_CACHE: dict[str, str] = {}
+
+
+def _patch_file(record: dict) -> None:
+    """loguru patcher：为记录填入缓存的定宽文件名，避免逐条截断与补齐。"""
+    file = record["file"]
+    name = _FILE_NAME_CACHE.get(file.path)
+    if name is None:
+        name = _FILE_NAME_CACHE[file.path] = f"{file.name:<18.18}"
+    record["extra"]["file18"] = name
+
+
+# 两个 handler 只由 setup_logging 安装，因此 emit 时以下引用已就绪。
+# 直接调用 loguru 的内部分发 Logger._log(level, from_decorator, options, message, args, kwargs)，
+# 跳过 opt() 每次新建的包装对象。options 为 (exception, depth, record, lazy, colors, raw,
+# capture, patchers, extra)，无异常时按栈深度缓存。依赖 loguru 0.7 的内部签名（pyproject 限定 <0.8），
+# _bind_loguru 在绑定前校验；内部结构不符时 _logger_log 保持 None，handler 改走公开的 logger.opt(depth=...)
+_LOG_PARAMS = ("level", "from_decorator", "options", "message", "args", "kwargs")
+_OPTIONS_LEN = 9
+_DEFAULT_LEVEL_NAMES = frozenset({"TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL"})
+# uvicorn.access 记录从 emit 到调用方的固定栈深度：
+# 调用方 → Logger.info → _log → handle → callHandlers → Handler.handle → emit
+_ACCESS_DEPTH = 6
+_logger_log: Callable[..., None] | None = None
+_BASE_OPTIONS: tuple = ()
+_OPTIONS_CACHE: dict[int, tuple] = {}
+_ACCESS_OPTIONS: tuple = ()
+_NO_KWARGS: dict[str, Any] = {}
+
+
+def _log_options(depth: int, exception: Any = None) -> tuple:
+    """
+    构造 _log 所需的 options；`depth` 与 logger.opt(depth=...) 含义相同。
+
+    直接调用 _log 比经由 Logger.log 少一层栈帧，因此内部深度减一。
+    """
+    if exception:
+        return (exception, depth - 1, *_BASE_OPTIONS[2:])
+    options = _OPTIONS_CACHE.get(depth)
+    if options is None:
+        options = _OPTIONS_CACHE[depth] = (None, depth - 1, *_BASE_OPTIONS[2:])
+    return options
+
+
+# stdout 块缓冲大小与最长刷新间隔（秒）
+_STDOUT_BUFFER_SIZE = 8192
+_STDOUT_FLUSH_INTERVAL = 0.2
+# 达到该级别（ERROR）的记录写入后立即刷新，不等待定时器
+_STDOUT_FLUSH_LEVEL_NO = logging.ERROR
+
+
+class _BufferedStdout:
+    """
+    块缓冲的 stdout sink：多条记录合并为一次 write 系统调用，后台线程定期刷新以限制延迟。
+
+    不提供 flush 方法，loguru 因此不会在每条记录后强制刷新；stop 由 loguru 在移除 sink 时调用。
+    ERROR 及以上的记录立即刷新，使其不落后于随后写到 stdout/stderr 的 traceback 等输出；
+    进程退出时经 atexit 再刷新一次，避免缓冲中的日志随进程丢失。
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="loguru-stdout-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self._flush)
+
+    def write(self, message: str) -> None:
+        record = getattr(message, "record", None)
+        with self._lock:
+            self._stream.write(message)
+            if record is not None and record["level"].no >= _STDOUT_FLUSH_LEVEL_NO:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        try:
+            self._stream.flush()
+        except (OSError, ValueError):
+            pass
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.wait(_STDOUT_FLUSH_INTERVAL):
+            self._flush()
+
+    def stop(self) -> None:
+        atexit.unregister(self._flush)
+        self._stopped.set()
+        self._thread.join()
+        self._flush()
+
+
+def _open_buffered_stdout() -> TextIO | _BufferedStdout:
+    """基于 stdout 文件描述符打开独立的块缓冲流；无真实 fd（如测试捕获）时直接使用 sys.stdout。"""
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        return sys.stdout
+    stream = open(
+        fd,
+        "w",
+        buffering=_STDOUT_BUFFER_SIZE,
+        encoding=sys.stdout.encoding or "utf-8",
+        errors="backslashreplace",
+        closefd=False,
+    )
+    return _BufferedStdout(stream)
+
 
 class InterceptHandler(logging.Handler):
-    """将标准 logging 记录转发到 loguru，统一彩色输出。"""
+    """将标准 logging 记录转发到 loguru，统一输出格式。"""
+
+    # 不新增实例属性；所需的缓存与 loguru 引用均放在模块级
+    __slots__ = ()
 
+    # emit 保持纯 Python：后端以 hatchling 构建为纯 Python 包，不引入 Cython/mypyc 编译步骤。
+    # 热路径已压缩为一次级别比较、一次缓存查找、逐帧的文件名比较和一次 Logger._log 调用
     def emit(self, record: logging.LogRecord) -> None:  # noqa: D401
-        try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
+        if record.levelno < _MIN_LEVEL_NO:
+            return
+
+        name = record.levelname
+        level = _LEVEL_CACHE.get(name)
+        if level is None:
+            # 未在 loguru 注册的级别名（自定义级别）按数值转发
+            level = _LEVEL_CACHE[name] = name if name in _LEVEL_NAMES else record.levelno
 
-        frame, depth = logging.currentframe(), 2
-        while frame and frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back  # pragma: no cover
+        # 从 emit 的上两层（Handler.handle 之上）开始，跳过 logging 内部栈帧找到真正的调用方
+        frame, depth = sys._getframe(2), 2
+        while frame is not None and frame.f_code.co_filename == _LOGGING_FILE:
+            frame = frame.f_back
             depth += 1
 
-        logger.opt(depth=depth, exception=record.exc_info).log(
-            level,
-            record.getMessage(),
-        )
+        # 无参数的记录无需经过 msg % args 插值；loguru 在未传参时也不会做 {} 格式化
+        # msg 已是 str 时（绝大多数情况）连 str() 调用也省去
+        msg = record.msg
+        if record.args:
+            message = record.getMessage()
+        elif msg.__class__ is str:
+            message = msg
+        else:
+            message = str(msg)
+        if _logger_log is not None:
+            _logger_log(level, False, _log_options(depth, record.exc_info), message, (), _NO_KWARGS)
+        else:
+            logger.opt(depth=depth, exception=record.exc_info).log(level, message)
+
+
+class AccessLogHandler(logging.Handler):
+    """
+    uvicorn.access 专用的精简转发：每个请求一条记录，调用方固定为 uvicorn 的 logger.info，
+    因此跳过级别解析与栈帧查找，直接使用固定深度。
+    """
+
+    __slots__ = ()
+
+    def emit(self, record: logging.LogRecord) -> None:  # noqa: D401
+        if record.levelno < _MIN_LEVEL_NO:
+            return
+        if _logger_log is not None:
+            _logger_log("INFO", False, _ACCESS_OPTIONS, record.getMessage(), (), _NO_KWARGS)
+        else:
+            logger.opt(depth=_ACCESS_DEPTH).log("INFO", record.getMessage())
+
+
+class _SampleFilter(logging.Filter):
+    """按比例随机保留记录，用于给访问日志抽样。"""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self._rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return random.random() < self._rate
+
+
+def _bind_loguru() -> None:
+    """校验并绑定两个 handler 所需的 loguru 内部引用；结构与 0.7 不符时退回公开 API。"""
+    global _LEVEL_NAMES, _logger_log, _BASE_OPTIONS, _ACCESS_OPTIONS
+
+    _LEVEL_CACHE.clear()
+    _OPTIONS_CACHE.clear()
+    _logger_log = None
+    levels = getattr(getattr(logger, "_core", None), "levels", None)
+    _LEVEL_NAMES = frozenset(levels) if isinstance(levels, dict) else _DEFAULT_LEVEL_NAMES
+
+    log = getattr(logger, "_log", None)
+    options = getattr(logger, "_options", None)
+    try:
+        params = tuple(inspect.signature(log).parameters)
+    except (TypeError, ValueError):
+        return
+    if params != _LOG_PARAMS or not isinstance(options, tuple) or len(options) != _OPTIONS_LEN:
+        return
+    _logger_log = log
+    _BASE_OPTIONS = options
+    _ACCESS_OPTIONS = _log_options(_ACCESS_DEPTH)
 
 
 def setup_logging() -> None:
     """
-    初始化 loguru 彩色日志，拦截标准 logging，确保 uvicorn/fastapi 输出一致。
+    初始化 loguru 日志（终端下彩色输出），拦截标准 logging，确保 uvicorn/fastapi 输出一致。
     """
-    log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+    global _MIN_LEVEL_NO
+
+    _bind_loguru()
 
-    # 清理默认 handler
-    logging.root.handlers = []
-    logging.root.setLevel(logging.NOTSET)
+    log_level = LOG_LEVEL
+
+    level_no = logging._checkLevel(log_level)
 
     # 拦截标准 logging
     intercept = InterceptHandler()
-    noisy = {
-        # 统一 uvicorn/fastapi
-        "uvicorn": log_level,
-        "uvicorn.error": log_level,
-        "uvicorn.access": log_level,
-        "fastapi": log_level,
-        # 降噪 SQL 日志：只在 WARNING 以上输出
-        "sqlalchemy.engine": "WARNING",
-        "sqlalchemy.pool": "WARNING",
-        "aiosqlite": "WARNING",
-    }
-    for name, lvl in noisy.items():
-        logging_logger = logging.getLogger(name)
-        logging_logger.handlers = [intercept]
-        logging_logger.propagate = False
-        logging_logger.setLevel(lvl)
-
-    logging.basicConfig(handlers=[intercept], level=log_level)
-
-    # 配置 loguru sink，启用颜色和精简格式
+    access = AccessLogHandler()
+
+    # 在 logging 模块锁内直接修改各 logger 的级别，避免每次 setLevel 都清理一遍
+    # isEnabledFor 缓存，最后统一清理一次
+    with logging._lock:
+        # 替换默认 handler；根 logger 直接设为目标级别，低级别调用在 Logger.isEnabledFor
+        # 阶段即被拒绝，不会创建 LogRecord，也不会进入 InterceptHandler
+        logging.root.handlers = [intercept]
+        logging.root.level = level_no
+
+        for name, lvl in _MANAGED_LOGGERS:
+            logging_logger = logging.getLogger(name)
+            logging_logger.handlers = [access if name == "uvicorn.access" else intercept]
+            logging_logger.propagate = False
+            logging_logger.level = level_no if lvl is None else logging._checkLevel(lvl)
+
+        access_logger = logging.getLogger("uvicorn.access")
+        access_logger.disabled = not LOG_ACCESS
+        access_logger.filters = [f for f in access_logger.filters if not isinstance(f, _SampleFilter)]
+        if LOG_ACCESS and LOG_ACCESS_SAMPLE_RATE < 1:
+            access_logger.addFilter(_SampleFilter(LOG_ACCESS_SAMPLE_RATE))
+
+        logging.Logger.manager._clear_cache()
+
+    # 配置 loguru sink：仅在终端中启用颜色（重定向到管道/文件或设置 NO_COLOR 时输出纯文本）
+    colorize = sys.stdout.isatty() and os.getenv("NO_COLOR") is None
     logger.remove()
+    logger.configure(patcher=_patch_file)
     logger.add(
-        sys.stdout,
+        _open_buffered_stdout(),
         level=log_level,
-        colorize=True,
-        # 仅打印时间 + level + 文件名:行号
-        format="<green>{time:HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
-        "<cyan>{file:<18.18}</cyan>:<cyan>{line:>4}</cyan> - <level>{message}</level>",
+        colorize=colorize,
+        format=_LOG_FORMAT if colorize else _PLAIN_LOG_FORMAT,
+        # 记录经队列交给后台线程格式化并写出，调用方线程/事件循环不再被 stdout 写阻塞
+        enqueue=True,
     )
 
+    _MIN_LEVEL_NO = logger.level(log_level).no
+
     logger.info("Loguru configured with level={}", log_level)
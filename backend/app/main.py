@@ -3,27 +3,39 @@ from __future__ import annotations
 import asyncio
 import contextlib
 import datetime as dt
-import json
 import os
-import re
 import shlex
+import shutil
+import socket
 import ssl
+import struct
+import tempfile
+import time
 import uuid
-from typing import Optional
+from typing import BinaryIO, Optional, Sequence
 from urllib.parse import urlparse
 
 import aiohttp
+import orjson
 from aiohttp_socks import ProxyConnector
 
 from loguru import logger
-from fastapi import BackgroundTasks, Body, Depends, FastAPI, File, Form, HTTPException, Query, UploadFile
+from fastapi import Body, Depends, FastAPI, File, Form, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import update
+from sqlalchemy import case, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from .enumeration_service import _append_log, run_subdomain_enumeration
+from ._patterns import DOMAIN_RE, NEWLINE_RE
+from .enumeration_service import run_subdomain_enumeration
 from .database import AsyncSessionLocal, get_session, init_db
+from .http_enumerator import (
+    _STOP_LOG_LINE,
+    _invalidate_default_wordlist_cache,
+    _release_run_log,
+    _render_run_log,
+)
 from .logging_config import setup_logging
 from .models import Proxy, Subdomain, SubdomainRun, Wordlist
 from .run_progress import clear_progress, get_progress, request_stop
@@ -53,17 +65,36 @@ from .schemas import (
 )
 
 MAX_WORDLIST_BYTES = 10 * 1024 * 1024
+# 上传字典按块流式落盘的块大小
+UPLOAD_CHUNK_SIZE = 64 * 1024
 WORDLIST_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "wordlists")
 WORDLIST_TYPES = {"subdomain", "username", "password"}
 DEFAULT_WORDLIST_TYPE = "subdomain"
 PROXY_TYPES = {"http", "https", "socks5"}
 # 使用可返回外网 IP/ASN 的测试端点，便于确认代理真实出网
 PROXY_TEST_URL = "http://ip.im/info"
+# 建连与读取分开计时：死代理在 connect 阶段即快速失败，不会耗尽整体预算
+PROXY_TEST_TIMEOUT = aiohttp.ClientTimeout(total=5, connect=2, sock_connect=2, sock_read=3)
 MAX_REQUEST_TEST_COUNT = 5
+REQUEST_TEST_TIMEOUT = aiohttp.ClientTimeout(total=20, connect=5, sock_read=15)
+# 请求测试返回的响应体最多展示的字符数
+MAX_RESPONSE_BODY_CHARS = 8000
+# 结果分页单页上限
+MAX_RESULTS_PAGE_SIZE = 10000
+# 结果条数达到该值时在线程中格式化
+RESULTS_THREAD_THRESHOLD = 2000
 REQUEST_TEST_VERIFY_SSL = os.getenv("REQUEST_TEST_VERIFY_SSL", "true").lower() == "true"
+# SOCKS5 代理地址解析结果缓存时间（秒），重复测试同一代理时跳过 DNS
+PROXY_ADDR_CACHE_TTL = 300
+_proxy_addr_cache: dict[tuple[str, int], tuple[float, list[tuple]]] = {}
 
 app = FastAPI(title="XTools Backend")
 
+# create_run 调度的后台枚举任务；事件循环只弱引用任务，需在此保留强引用
+_background_tasks: set[asyncio.Task] = set()
+# 枚举任务尚未结束的运行；这些运行的日志缓冲由任务自己落库并在结束时释放
+_active_run_ids: set[int] = set()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -73,12 +104,50 @@ app.add_middleware(
 )
 
 
+def _get_http_session() -> aiohttp.ClientSession:
+    """
+    返回进程级共享的 aiohttp 会话，代理测试与请求测试复用其连接池（保活、DNS 缓存）。
+
+    正常由 startup 创建；未经过 startup（如测试直接挂载 ASGI 应用）时按需创建。
+    会话跨请求共享，因此不保存 Cookie，避免某次响应的 Set-Cookie 被带进之后无关的请求。
+    """
+    session: Optional[aiohttp.ClientSession] = getattr(app.state, "http_session", None)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=20,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True,
+            ),
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        app.state.http_session = session
+    return session
+
+
 @app.on_event("startup")
 async def on_startup() -> None:
     setup_logging()
     logger.info("Starting backend service")
     os.makedirs(WORDLIST_DIR, exist_ok=True)
     await init_db()
+    _get_http_session()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    # 取消仍在运行的枚举任务，避免事件循环关闭时任务被强行丢弃
+    pending = list(_background_tasks)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    session: Optional[aiohttp.ClientSession] = getattr(app.state, "http_session", None)
+    if session is not None:
+        await session.close()
+    # 等待后台日志线程写完队列中的剩余记录
+    await logger.complete()
 
 
 async def _start_run_task(run_id: int, domain: str, wordlist_id: Optional[int]) -> None:
@@ -86,8 +155,35 @@ async def _start_run_task(run_id: int, domain: str, wordlist_id: Optional[int])
         await run_subdomain_enumeration(session, run_id, domain, wordlist_id)
 
 
+def _on_background_task_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.opt(exception=task.exception()).error("Background run task failed")
+
+
+def _spawn_background_task(coro) -> asyncio.Task:
+    """在事件循环上直接调度后台任务，并持有引用防止任务在完成前被回收。"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_task_done)
+    return task
+
+
+def _spawn_run_task(run_id: int, domain: str, wordlist_id: Optional[int]) -> asyncio.Task:
+    """调度运行的枚举任务并登记为活跃；任务结束（含取消）后注销并释放其日志缓冲。"""
+    _active_run_ids.add(run_id)
+    task = _spawn_background_task(_start_run_task(run_id, domain, wordlist_id))
+    task.add_done_callback(lambda _task: _finish_run_task(run_id))
+    return task
+
+
+def _finish_run_task(run_id: int) -> None:
+    _active_run_ids.discard(run_id)
+    _release_run_log(run_id)
+
+
 def _validate_domain(domain: str) -> None:
-    if not re.match(r"^[A-Za-z0-9.-]+\.[A-Za-z]{2,}$", domain):
+    if not DOMAIN_RE.match(domain):
         raise HTTPException(status_code=400, detail="Invalid domain format")
 
 
@@ -102,11 +198,15 @@ def _normalize_wordlist_type(wordlist_type: Optional[str], *, default: Optional[
 
 
 def _normalize_newlines(content: str) -> str:
-    return content.replace("\r\n", "\n").replace("\r", "\n")
+    # 多数内容本就是 \n 换行，直接返回；否则一次扫描同时处理 \r\n 与 \r
+    if "\r" not in content:
+        return content
+    return NEWLINE_RE.sub("\n", content)
 
 
 def _count_non_empty_lines(content: str) -> int:
-    return len([line for line in _normalize_newlines(content).split("\n") if line.strip() != ""])
+    # splitlines 本身识别 \r\n / \r / \n，无需先规范化换行，也不构建中间列表
+    return sum(1 for line in content.splitlines() if line.strip())
 
 
 def _read_wordlist_content(wordlist: Wordlist) -> str:
@@ -117,6 +217,30 @@ def _read_wordlist_content(wordlist: Wordlist) -> str:
         raise HTTPException(status_code=404, detail="Wordlist file not found")
 
 
+def _save_wordlist_file(path: str, src: BinaryIO) -> int:
+    """
+    将上传内容按块流式写入 path 并返回字节数，不在内存中保留完整内容。
+
+    内容为空或超过 MAX_WORDLIST_BYTES 时删除已写入的部分文件并返回 400。
+    """
+    size = 0
+    detail = None
+    with open(path, "wb") as f:
+        while chunk := src.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_WORDLIST_BYTES:
+                detail = "Wordlist too large"
+                break
+            f.write(chunk)
+    if detail is None and size == 0:
+        detail = "Wordlist is empty"
+    if detail is not None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        raise HTTPException(status_code=400, detail=detail)
+    return size
+
+
 def _write_wordlist_content(wordlist: Wordlist, content: str) -> str:
     normalized = _normalize_newlines(content)
     encoded = normalized.encode("utf-8")
@@ -132,16 +256,51 @@ def _write_wordlist_content(wordlist: Wordlist, content: str) -> str:
 
 def _dedupe_content(content: str) -> tuple[str, int, int]:
     normalized = _normalize_newlines(content)
-    lines = [line.strip() for line in normalized.split("\n") if line.strip() != ""]
-    seen = set()
-    deduped: list[str] = []
-    for line in lines:
-        if line in seen:
-            continue
-        seen.add(line)
-        deduped.append(line)
-    deduped_content = "\n".join(deduped)
-    return deduped_content, len(lines), len(deduped)
+    lines = [line for line in (raw.strip() for raw in normalized.split("\n")) if line]
+    # dict 保持插入顺序，fromkeys 在 C 层完成去重
+    deduped = list(dict.fromkeys(lines))
+    return "\n".join(deduped), len(lines), len(deduped)
+
+
+def _dedupe_wordlist_file(wordlist: Wordlist) -> tuple[int, int]:
+    """
+    逐行流式去重字典文件：写入同目录临时文件后用 os.replace 原子替换，
+    内存占用只与不重复行数相关，不再整体载入文件。返回 (去重前行数, 去重后行数)。
+    """
+    directory = os.path.dirname(wordlist.path) or "."
+    seen: set[str] = set()
+    before = after = size = 0
+    try:
+        src = open(wordlist.path, "r", encoding="utf-8", errors="ignore")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Wordlist file not found")
+    with src, tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, delete=False) as dst:
+        try:
+            for raw in src:
+                line = raw.strip()
+                if not line:
+                    continue
+                before += 1
+                if line in seen:
+                    continue
+                seen.add(line)
+                chunk = line if after == 0 else "\n" + line
+                dst.write(chunk)
+                size += len(chunk.encode("utf-8"))
+                after += 1
+        except BaseException:
+            dst.close()
+            os.unlink(dst.name)
+            raise
+
+    if after == 0 or size > MAX_WORDLIST_BYTES:
+        os.unlink(dst.name)
+        detail = "Wordlist is empty after dedupe" if after == 0 else "Wordlist too large"
+        raise HTTPException(status_code=400, detail=detail)
+    shutil.copymode(wordlist.path, dst.name)
+    os.replace(dst.name, wordlist.path)
+    wordlist.size_bytes = size
+    return before, after
 
 
 def _map_run(run: SubdomainRun) -> RunResponse:
@@ -150,20 +309,12 @@ def _map_run(run: SubdomainRun) -> RunResponse:
     if total and total > 0:
         progress_percent = round(min(processed / total * 100, 100), 2)
 
-    return RunResponse(
-        id=run.id,
-        domain=run.domain,
-        status=run.status,
-        log_snippet=run.log_snippet,
-        error_message=run.error_message,
-        started_at=run.started_at,
-        finished_at=run.finished_at,
-        created_at=run.created_at,
-        wordlist_id=run.wordlist_id,
-        progress_total=total,
-        progress_processed=processed,
-        progress_percent=progress_percent,
-    )
+    # 数据库字段由 pydantic 按属性一次性读取，进度字段来自内存，校验后再补上
+    response = RunResponse.model_validate(run)
+    response.progress_total = total
+    response.progress_processed = processed
+    response.progress_percent = progress_percent
+    return response
 
 
 def _validate_proxy_type(proxy_type: str) -> str:
@@ -197,17 +348,16 @@ async def _test_proxy_connectivity(proxy: Proxy) -> float:
         proxy_url = f"http://{proxy.host}:{proxy.port}"
         auth = aiohttp.BasicAuth(proxy.username, proxy.password or "") if proxy.username else None
         try:
-            timeout = aiohttp.ClientTimeout(total=5)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(
-                    PROXY_TEST_URL,
-                    proxy=proxy_url,
-                    proxy_auth=auth,
-                    ssl=ssl_ctx,
-                    allow_redirects=False,
-                ) as resp:
-                    if resp.status >= 400:
-                        raise RuntimeError(f"HTTP 状态码异常：{resp.status}")
+            async with _get_http_session().get(
+                PROXY_TEST_URL,
+                proxy=proxy_url,
+                proxy_auth=auth,
+                ssl=ssl_ctx,
+                allow_redirects=False,
+                timeout=PROXY_TEST_TIMEOUT,
+            ) as resp:
+                if resp.status >= 400:
+                    raise RuntimeError(f"HTTP 状态码异常：{resp.status}")
         except Exception as exc:
             extra = ""
             if isinstance(exc, aiohttp.ClientConnectorError) and exc.os_error:
@@ -223,67 +373,129 @@ async def _test_proxy_connectivity(proxy: Proxy) -> float:
     return round(elapsed, 2)
 
 
+# SOCKS5 握手报文的定长部分：问候 VER/NMETHODS/METHOD、两字节应答、CONNECT 应答头 + 地址首字节
+_SOCKS5_GREETING = struct.Struct("!BBB")
+_SOCKS5_PAIR = struct.Struct("!BB")
+_SOCKS5_REPLY_HEAD = struct.Struct("!BBBBB")
+
+
+async def _resolve_proxy_addr(host: str, port: int) -> list[tuple]:
+    """解析代理地址并按 PROXY_ADDR_CACHE_TTL 缓存 getaddrinfo 结果。"""
+    key = (host, port)
+    now = time.monotonic()
+    cached = _proxy_addr_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    infos = await asyncio.get_running_loop().getaddrinfo(
+        host, port, type=socket.SOCK_STREAM, proto=socket.IPPROTO_TCP
+    )
+    _proxy_addr_cache[key] = (now + PROXY_ADDR_CACHE_TTL, infos)
+    return infos
+
+
+async def _open_nodelay_connection(
+    host: str, port: int
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """建立关闭 Nagle 的 TCP 连接，握手阶段的小包无需等待合并即可发出。"""
+    loop = asyncio.get_running_loop()
+    last_exc: OSError | None = None
+    for family, type_, proto, _, addr in await _resolve_proxy_addr(host, port):
+        sock = socket.socket(family, type_, proto)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setblocking(False)
+            await loop.sock_connect(sock, addr)
+        except OSError as exc:
+            sock.close()
+            last_exc = exc
+            continue
+        except BaseException:
+            sock.close()
+            raise
+        return await asyncio.open_connection(sock=sock)
+    # 所有地址均连接失败，缓存的解析结果可能已过期
+    _proxy_addr_cache.pop((host, port), None)
+    raise last_exc or OSError(f"无法解析代理地址 {host}")
+
+
 async def _test_socks5_proxy(proxy: Proxy, dest_host: str, dest_port: int) -> None:
     reader: asyncio.StreamReader | None = None
     writer: asyncio.StreamWriter | None = None
     try:
         reader, writer = await asyncio.wait_for(
-            asyncio.open_connection(proxy.host, proxy.port),
+            _open_nodelay_connection(proxy.host, proxy.port),
             timeout=5.0,
         )
 
-        # auth negotiation
+        # auth negotiation：问候需单独一个往返，服务端选定的方法决定后续是否认证
         use_auth = bool(proxy.username)
-        methods = b"\x02" if use_auth else b"\x00"
-        writer.write(b"\x05\x01" + methods)
+        writer.write(_SOCKS5_GREETING.pack(0x05, 1, 0x02 if use_auth else 0x00))
         await writer.drain()
         ver_method = await asyncio.wait_for(reader.readexactly(2), timeout=5.0)
-        if ver_method[0] != 0x05 or ver_method[1] == 0xFF:
+        version, method = _SOCKS5_PAIR.unpack(ver_method)
+        if version != 0x05 or method == 0xFF:
             raise RuntimeError("SOCKS5 握手失败")
-        if use_auth and ver_method[1] == 0x02:
-            username = proxy.username or ""
-            password = proxy.password or ""
+
+        if method == 0x02:
+            if not use_auth:
+                raise RuntimeError("SOCKS5 代理要求用户名密码认证")
+            # RFC 1929：认证子协商必须先收到应答再发送 CONNECT，认证失败时代理会直接断开
+            # 长度字段按编码后的字节数计算
+            username = (proxy.username or "").encode()
+            password = (proxy.password or "").encode()
             if len(username) > 255 or len(password) > 255:
                 raise RuntimeError("用户名或密码过长")
             writer.write(
-                b"\x01"
-                + bytes([len(username)])
-                + username.encode()
-                + bytes([len(password)])
-                + password.encode()
+                struct.pack(
+                    f"!BB{len(username)}sB{len(password)}s",
+                    0x01,
+                    len(username),
+                    username,
+                    len(password),
+                    password,
+                )
             )
             await writer.drain()
             auth_resp = await asyncio.wait_for(reader.readexactly(2), timeout=5.0)
-            if auth_resp[1] != 0x00:
+            _, status = _SOCKS5_PAIR.unpack(auth_resp)
+            if status != 0x00:
                 raise RuntimeError("SOCKS5 认证失败")
+        elif method != 0x00:
+            raise RuntimeError(f"SOCKS5 代理选择了不支持的认证方式 {method}")
 
         # connect command
         host_bytes = dest_host.encode()
         if len(host_bytes) > 255:
             raise RuntimeError("目标主机名过长")
-        request = (
-            b"\x05\x01\x00\x03"
-            + bytes([len(host_bytes)])
-            + host_bytes
-            + dest_port.to_bytes(2, "big")
+        writer.write(
+            struct.pack(
+                f"!BBBBB{len(host_bytes)}sH",
+                0x05,
+                0x01,
+                0x00,
+                0x03,
+                len(host_bytes),
+                host_bytes,
+                dest_port,
+            )
         )
-        writer.write(request)
         await writer.drain()
-        resp_head = await asyncio.wait_for(reader.readexactly(4), timeout=5.0)
-        if resp_head[1] != 0x00:
-            raise RuntimeError(f"SOCKS5 连接失败，返回码 {resp_head[1]}")
-
-        atyp = resp_head[3]
-        if atyp == 0x01:  # IPv4
-            await asyncio.wait_for(reader.readexactly(4 + 2), timeout=5.0)
-        elif atyp == 0x03:  # Domain
-            domain_len = await asyncio.wait_for(reader.readexactly(1), timeout=5.0)
-            await asyncio.wait_for(
-                reader.readexactly(domain_len[0] + 2),
-                timeout=5.0,
-            )
+
+        # 响应头与 BND.ADDR 首字节一次读取（域名类型时该字节即长度），剩余部分再一次读完
+        resp_head = await asyncio.wait_for(reader.readexactly(5), timeout=5.0)
+        _, reply, _, atyp, addr_first = _SOCKS5_REPLY_HEAD.unpack(resp_head)
+        if reply != 0x00:
+            raise RuntimeError(f"SOCKS5 连接失败，返回码 {reply}")
+
+        remaining = 0
+        if atyp == 0x01:  # IPv4：4 字节地址 + 2 字节端口，已读 1 字节
+            remaining = 4 - 1 + 2
+        elif atyp == 0x03:  # Domain：首字节为长度
+            remaining = addr_first + 2
         elif atyp == 0x04:  # IPv6
-            await asyncio.wait_for(reader.readexactly(16 + 2), timeout=5.0)
+            remaining = 16 - 1 + 2
+        if remaining:
+            await asyncio.wait_for(reader.readexactly(remaining), timeout=5.0)
 
         # send a tiny request to ensure data flows
         writer.write(b"GET / HTTP/1.1\r\nHost: example.com\r\nConnection: close\r\n\r\n")
@@ -298,11 +510,33 @@ async def _test_socks5_proxy(proxy: Proxy, dest_host: str, dest_port: int) -> No
                 await writer.wait_closed()
 
 
+# curl 选项到参数类别的映射，解析时每个 token 只需一次字典查找
+_CURL_OPTIONS: dict[str, str] = {
+    "-X": "method",
+    "--request": "method",
+    "-H": "header",
+    "--header": "header",
+    "-d": "data",
+    "--data": "data",
+    "--data-raw": "data",
+    "--data-binary": "data",
+    "--data-ascii": "data",
+}
+
+# 出现这些字符时才需要 shlex 处理引号与转义
+_SHLEX_SPECIAL_CHARS = frozenset("'\"\\")
+
+
 def _parse_curl_command(curl_command: str) -> tuple[str, str, dict[str, str], Optional[str]]:
-    try:
-        tokens = shlex.split(curl_command.strip())
-    except ValueError as exc:
-        raise HTTPException(status_code=400, detail=f"无法解析 curl：{exc}") from exc
+    command = curl_command.strip()
+    # 不含引号和反斜杠时 shlex 与按空白切分结果一致，直接走 str.split
+    if _SHLEX_SPECIAL_CHARS.isdisjoint(command):
+        tokens = command.split()
+    else:
+        try:
+            tokens = shlex.split(command)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"无法解析 curl：{exc}") from exc
 
     if not tokens:
         raise HTTPException(status_code=400, detail="curl 命令为空")
@@ -313,30 +547,27 @@ def _parse_curl_command(curl_command: str) -> tuple[str, str, dict[str, str], Op
     data: Optional[str] = None
     url: Optional[str] = None
     i = 0
-    while i < len(tokens):
+    count = len(tokens)
+    while i < count:
         token = tokens[i]
-        if token in ("-X", "--request") and i + 1 < len(tokens):
-            method = tokens[i + 1].upper()
-            i += 2
-            continue
-        if token in ("-H", "--header") and i + 1 < len(tokens):
-            raw_header = tokens[i + 1]
-            if ":" not in raw_header:
-                raise HTTPException(status_code=400, detail=f"无效请求头：{raw_header}")
-            key, value = raw_header.split(":", 1)
-            headers[key.strip()] = value.strip()
+        kind = _CURL_OPTIONS.get(token)
+        if kind is not None and i + 1 < count:
+            value = tokens[i + 1]
+            if kind == "method":
+                method = value.upper()
+            elif kind == "header":
+                if ":" not in value:
+                    raise HTTPException(status_code=400, detail=f"无效请求头：{value}")
+                key, header_value = value.split(":", 1)
+                headers[key.strip()] = header_value.strip()
+            else:
+                data = value
+                if method == "GET":
+                    method = "POST"
             i += 2
             continue
-        if token in ("-d", "--data", "--data-raw", "--data-binary", "--data-ascii") and i + 1 < len(tokens):
-            data = tokens[i + 1]
-            if method == "GET":
-                method = "POST"
-            i += 2
-            continue
-        if token.startswith("http://") or token.startswith("https://"):
+        if token.startswith(("http://", "https://")):
             url = token
-            i += 1
-            continue
         i += 1
 
     if url is None:
@@ -355,57 +586,82 @@ def _build_proxy_url(proxy: Proxy) -> str:
     return f"{scheme}://{auth}{proxy.host}:{proxy.port}"
 
 
+_request_ssl_context: Optional[ssl.SSLContext] = None
+
+
 def _get_request_ssl_context() -> ssl.SSLContext:
-    ctx = ssl.create_default_context()
-    if not REQUEST_TEST_VERIFY_SSL:
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-    return ctx
+    """
+    返回进程级共享的 SSLContext，只在首次调用时加载系统 CA。
+
+    复用同一上下文对象也让共享会话的连接池能按 ssl 参数命中已有连接。
+    """
+    global _request_ssl_context
+    if _request_ssl_context is None:
+        ctx = ssl.create_default_context()
+        if not REQUEST_TEST_VERIFY_SSL:
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+        _request_ssl_context = ctx
+    return _request_ssl_context
+
+
+async def _read_limited_text(resp: aiohttp.ClientResponse) -> str:
+    """
+    流式读取响应体，超过展示上限即停止，避免大响应被完整下载和解码。
+
+    UTF-8 单字符最多 4 字节，读满 MAX_RESPONSE_BODY_CHARS * 4 字节足以判断是否需要截断。
+    """
+    byte_limit = MAX_RESPONSE_BODY_CHARS * 4
+    chunks: list[bytes] = []
+    total = 0
+    async for chunk in resp.content.iter_any():
+        chunks.append(chunk)
+        total += len(chunk)
+        if total > byte_limit:
+            break
+    raw = b"".join(chunks)
+    try:
+        text = raw.decode(resp.charset or "utf-8", errors="ignore")
+    except LookupError:
+        text = raw.decode("utf-8", errors="ignore")
+    # 限制响应体展示长度
+    if len(text) <= MAX_RESPONSE_BODY_CHARS:
+        return text
+    return text[:MAX_RESPONSE_BODY_CHARS] + "\n...[truncated]"
 
 
 async def _execute_single_request(
+    session: aiohttp.ClientSession,
     method: str,
     url: str,
     headers: dict[str, str],
     data: Optional[str],
-    proxy: Optional[Proxy],
+    proxy_url: Optional[str] = None,
 ) -> RequestTestResult:
     start = dt.datetime.now(dt.timezone.utc)
-    proxy_url: Optional[str] = None
-    connector = None
-    ssl_ctx = _get_request_ssl_context()
-
-    if proxy:
-        if proxy.type == "socks5":
-            connector = ProxyConnector.from_url(_build_proxy_url(proxy), ssl=ssl_ctx)
-        else:
-            proxy_url = _build_proxy_url(proxy)
-
-    timeout = aiohttp.ClientTimeout(total=20)
     try:
-        async with aiohttp.ClientSession(timeout=timeout, connector=connector, connector_owner=True) as session:
-            async with session.request(
-                method,
-                url,
-                headers=headers,
-                data=data,
-                proxy=proxy_url,
-                ssl=ssl_ctx,
-                allow_redirects=False,
-            ) as resp:
-                text = await resp.text(errors="ignore")
-                elapsed = (dt.datetime.now(dt.timezone.utc) - start).total_seconds() * 1000
-                # 限制响应体展示长度
-                body = text if len(text) <= 8000 else text[:8000] + "\n...[truncated]"
-                return RequestTestResult(
-                    index=0,
-                    url=url,
-                    method=method,
-                    status=resp.status,
-                    headers={k: v for k, v in resp.headers.items()},
-                    body=body,
-                    elapsed_ms=round(elapsed, 2),
-                )
+        async with session.request(
+            method,
+            url,
+            headers=headers,
+            data=data,
+            proxy=proxy_url,
+            ssl=_get_request_ssl_context(),
+            allow_redirects=False,
+            timeout=REQUEST_TEST_TIMEOUT,
+        ) as resp:
+            body = await _read_limited_text(resp)
+            elapsed = (dt.datetime.now(dt.timezone.utc) - start).total_seconds() * 1000
+            return RequestTestResult(
+                index=0,
+                url=url,
+                method=method,
+                status=resp.status,
+                # 直接由键值对构造，重复头与原推导式一致以最后一个值为准
+                headers=dict(resp.headers.items()),
+                body=body,
+                elapsed_ms=round(elapsed, 2),
+            )
     except Exception as exc:  # noqa: BLE001
         elapsed = (dt.datetime.now(dt.timezone.utc) - start).total_seconds() * 1000
         cause = ""
@@ -423,19 +679,18 @@ async def _execute_single_request(
 @app.post("/runs", response_model=RunResponse)
 async def create_run(
     payload: RunCreateRequest,
-    background_tasks: BackgroundTasks,
     session: AsyncSession = Depends(get_session),
 ) -> RunResponse:
     _validate_domain(payload.domain)
 
-    selected_wordlist = None
     if payload.wordlist_id is not None:
-        stmt = select(Wordlist).where(Wordlist.id == payload.wordlist_id)
-        result = await session.exec(stmt)
-        selected_wordlist = result.first()
-        if selected_wordlist is None:
+        # 只取校验所需的 type 列，不构造 ORM 实例
+        wordlist_type = await session.scalar(
+            select(Wordlist.type).where(Wordlist.id == payload.wordlist_id)
+        )
+        if wordlist_type is None:
             raise HTTPException(status_code=404, detail="Wordlist not found")
-        if selected_wordlist.type != DEFAULT_WORDLIST_TYPE:
+        if wordlist_type != DEFAULT_WORDLIST_TYPE:
             raise HTTPException(
                 status_code=400,
                 detail="Wordlist type must be subdomain for enumeration runs",
@@ -446,7 +701,8 @@ async def create_run(
     await session.commit()
     await session.refresh(run)
 
-    background_tasks.add_task(_start_run_task, run.id, payload.domain, payload.wordlist_id)
+    # 直接创建任务而非 BackgroundTasks：无需等响应发送完毕、也不依附请求生命周期
+    _spawn_run_task(run.id, payload.domain, payload.wordlist_id)
     return _map_run(run)
 
 
@@ -470,41 +726,78 @@ async def stop_run(
 
     request_stop(run_id)
     if run.status == "running":
-        run.status = "canceled"
-        run.finished_at = dt.datetime.now(dt.timezone.utc)
-        run.error_message = "任务已被用户停止"
-        run.log_snippet = _append_log(run.log_snippet or "", "⏹ 任务已被用户停止")
-        session.add(run)
+        values = {
+            "status": "canceled",
+            "finished_at": dt.datetime.now(dt.timezone.utc),
+            "error_message": "任务已被用户停止",
+            # 日志只放进 values，不赋给 run，否则 autoflush 会先发出一条不带 status 条件的 UPDATE
+            "log_snippet": _render_run_log(run, _STOP_LOG_LINE),
+        }
+        # 单条 UPDATE 完成状态切换，无需 ORM 脏检查与提交后的 refresh；
+        # 以 status 作为条件，避免覆盖枚举器刚写入的终态
+        result = await session.execute(
+            update(SubdomainRun)
+            .where(SubdomainRun.id == run_id, SubdomainRun.status == "running")
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
         await session.commit()
-        await session.refresh(run)
+        # 枚举任务仍在运行时缓冲留给它：之后的落库在此基础上追加，不会覆盖停止日志，
+        # 任务结束时再释放；未命中 UPDATE 或已无枚举任务时，缓冲只是上面刚重建的，直接释放
+        if not result.rowcount or run_id not in _active_run_ids:
+            _release_run_log(run_id)
+        if result.rowcount:
+            for key, value in values.items():
+                set_committed_value(run, key, value)
+        else:
+            await session.refresh(run)
     clear_progress(run_id)
     return _map_run(run)
 
 
+def _format_results(rows: Sequence[tuple]) -> list[SubdomainResult]:
+    # metadata 由枚举器以 orjson 写入，这里同样用 orjson 解析
+    loads = orjson.loads
+    return [
+        SubdomainResult(
+            host=host,
+            source=source,
+            discovered_at=created_at,
+            metadata=(loads(metadata_json) if metadata_json else None),
+        )
+        for host, source, created_at, metadata_json in rows
+    ]
+
+
 @app.get("/runs/{run_id}/results", response_model=RunResultsResponse)
 async def get_run_results(
-    run_id: int, session: AsyncSession = Depends(get_session)
+    run_id: int,
+    session: AsyncSession = Depends(get_session),
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_RESULTS_PAGE_SIZE),
+    offset: int = Query(default=0, ge=0),
 ) -> RunResultsResponse:
     run = await session.get(SubdomainRun, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
 
-    stmt = select(Subdomain).where(Subdomain.run_id == run_id)
-    result = await session.exec(stmt)
-    items = result.all()
-    return RunResultsResponse(
-        run_id=run_id,
-        status=run.status,
-        results=[
-            SubdomainResult(
-                host=item.host,
-                source=item.source,
-                discovered_at=item.created_at,
-                metadata=(json.loads(item.metadata_json) if item.metadata_json else None),
-            )
-            for item in items
-        ],
+    # 只取响应需要的列，跳过 ORM 实例构造；按 (run_id, created_at) 索引顺序返回，
+    # id 兜底保证分页稳定。未传 limit 时保持返回全部结果，兼容现有前端轮询
+    stmt = (
+        select(Subdomain.host, Subdomain.source, Subdomain.created_at, Subdomain.metadata_json)
+        .where(Subdomain.run_id == run_id)
+        .order_by(Subdomain.created_at, Subdomain.id)
+        .offset(offset)
     )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await session.exec(stmt)
+    rows = result.all()
+    # 结果较多时解析与模型构造移到线程中，避免阻塞事件循环
+    if len(rows) >= RESULTS_THREAD_THRESHOLD:
+        results = await asyncio.to_thread(_format_results, rows)
+    else:
+        results = _format_results(rows)
+    return RunResultsResponse(run_id=run_id, status=run.status, results=results)
 
 
 @app.get("/wordlists", response_model=WordlistListResponse)
@@ -540,7 +833,8 @@ async def get_wordlist_detail(
     wordlist = await session.get(Wordlist, wordlist_id)
     if not wordlist:
         raise HTTPException(status_code=404, detail="Wordlist not found")
-    content = _normalize_newlines(_read_wordlist_content(wordlist))
+    # 文件读写放到线程中执行，避免大字典阻塞事件循环
+    content = _normalize_newlines(await asyncio.to_thread(_read_wordlist_content, wordlist))
     return WordlistDetail(
         id=wordlist.id,
         name=wordlist.name,
@@ -561,11 +855,6 @@ async def upload_wordlist(
     is_default: bool = Form(False),
     wordlist_type: str = Form(DEFAULT_WORDLIST_TYPE, alias="type"),
 ) -> WordlistUploadResponse:
-    content = await file.read()
-    if len(content) == 0:
-        raise HTTPException(status_code=400, detail="Wordlist is empty")
-    if len(content) > MAX_WORDLIST_BYTES:
-        raise HTTPException(status_code=400, detail="Wordlist too large")
     if file.content_type not in (None, "", "text/plain"):
         raise HTTPException(status_code=400, detail="Only text wordlists are allowed")
 
@@ -576,25 +865,28 @@ async def upload_wordlist(
     filename = f"{uuid.uuid4().hex}{ext}"
     path = os.path.join(WORDLIST_DIR, filename)
 
-    with open(path, "wb") as f:
-        f.write(content)
+    # 在线程中把上传的临时文件按块拷贝到字典目录，同时统计大小
+    size_bytes = await asyncio.to_thread(_save_wordlist_file, path, file.file)
 
     if is_default:
+        # 只改写当前为默认的行，其余行保持不动
         await session.execute(
             update(Wordlist)
-            .where(Wordlist.type == normalized_type)
+            .where(Wordlist.type == normalized_type, Wordlist.is_default.is_(True))
             .values(is_default=False)
         )
 
     entry = Wordlist(
         name=safe_name,
         path=path,
-        size_bytes=len(content),
+        size_bytes=size_bytes,
         is_default=is_default,
         type=normalized_type,
     )
     session.add(entry)
     await session.commit()
+    if is_default:
+        _invalidate_default_wordlist_cache()
     await session.refresh(entry)
 
     return WordlistUploadResponse(
@@ -622,7 +914,7 @@ async def update_wordlist(
         if new_name:
             wordlist.name = new_name
 
-    normalized = _write_wordlist_content(wordlist, payload.content)
+    normalized = await asyncio.to_thread(_write_wordlist_content, wordlist, payload.content)
     session.add(wordlist)
     await session.commit()
     await session.refresh(wordlist)
@@ -649,13 +941,15 @@ async def dedupe_wordlist(
     if not wordlist:
         raise HTTPException(status_code=404, detail="Wordlist not found")
 
-    existing_content = _read_wordlist_content(wordlist)
-    base_content = payload.content if payload and payload.content is not None else existing_content
-    deduped_content, before_lines, after_lines = _dedupe_content(base_content)
-    if after_lines == 0:
-        raise HTTPException(status_code=400, detail="Wordlist is empty after dedupe")
-
-    normalized = _write_wordlist_content(wordlist, deduped_content)
+    if payload and payload.content is not None:
+        # 前端提交了编辑中的内容：内容已在内存中，直接去重后写回
+        deduped_content, before_lines, after_lines = _dedupe_content(payload.content)
+        if after_lines == 0:
+            raise HTTPException(status_code=400, detail="Wordlist is empty after dedupe")
+        normalized = await asyncio.to_thread(_write_wordlist_content, wordlist, deduped_content)
+    else:
+        before_lines, after_lines = await asyncio.to_thread(_dedupe_wordlist_file, wordlist)
+        normalized = await asyncio.to_thread(_read_wordlist_content, wordlist)
     session.add(wordlist)
     await session.commit()
     await session.refresh(wordlist)
@@ -682,14 +976,19 @@ async def set_default_wordlist(
     if not wordlist:
         raise HTTPException(status_code=404, detail="Wordlist not found")
 
+    # 同类型字典的默认标记在一条 UPDATE 中完成切换，无需再单独写回目标记录；
+    # 只涉及原默认行与目标行，其余行不会被改写
     await session.execute(
         update(Wordlist)
-        .where(Wordlist.type == wordlist.type)
-        .values(is_default=False)
+        .where(
+            Wordlist.type == wordlist.type,
+            or_(Wordlist.is_default.is_(True), Wordlist.id == wordlist_id),
+        )
+        .values(is_default=case((Wordlist.id == wordlist_id, True), else_=False))
+        .execution_options(synchronize_session=False)
     )
-    wordlist.is_default = True
-    session.add(wordlist)
     await session.commit()
+    _invalidate_default_wordlist_cache()
     await session.refresh(wordlist)
 
     return WordlistOut(
@@ -716,6 +1015,8 @@ async def delete_wordlist(
 
     await session.delete(wordlist)
     await session.commit()
+    if wordlist.is_default:
+        _invalidate_default_wordlist_cache()
     return WordlistDeleteResponse(ok=True)
 
 
@@ -825,20 +1126,35 @@ async def run_request_test(
 
     count = min(max(payload.count, 1), MAX_REQUEST_TEST_COUNT)
     results: list[RequestTestResult] = []
-    if payload.mode == "parallel":
-        tasks = [
-            _execute_single_request(method, url, headers, data, proxy) for _ in range(count)
-        ]
-        gathered = await asyncio.gather(*tasks)
-        for idx, item in enumerate(gathered):
-            item.index = idx + 1
-        results = list(gathered)
-    else:
-        for idx in range(count):
-            result = await _execute_single_request(method, url, headers, data, proxy)
-            result.index = idx + 1
-            results.append(result)
-            await asyncio.sleep(0.05)
+    async with contextlib.AsyncExitStack() as stack:
+        # 同一批次的所有请求共用一个会话：直连与 HTTP(S) 代理复用共享连接池，
+        # SOCKS5 的 ProxyConnector 每批只建一次，批内请求复用其连接与握手；
+        # 与共享会话一样不保存 Cookie，批内每次请求都是同一条 curl 的独立重放
+        proxy_url = _build_proxy_url(proxy) if proxy else None
+        if proxy and proxy.type == "socks5":
+            connector = ProxyConnector.from_url(proxy_url, ssl=_get_request_ssl_context(), limit=count)
+            http_session = await stack.enter_async_context(
+                aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+            )
+            proxy_url = None
+        else:
+            http_session = _get_http_session()
+
+        if payload.mode == "parallel":
+            tasks = [
+                _execute_single_request(http_session, method, url, headers, data, proxy_url)
+                for _ in range(count)
+            ]
+            gathered = await asyncio.gather(*tasks)
+            for idx, item in enumerate(gathered):
+                item.index = idx + 1
+            results = list(gathered)
+        else:
+            for idx in range(count):
+                result = await _execute_single_request(http_session, method, url, headers, data, proxy_url)
+                result.index = idx + 1
+                results.append(result)
+                await asyncio.sleep(0.05)
 
     return RequestTestResponse(results=results)
 
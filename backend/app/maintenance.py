@@ -19,6 +19,9 @@ from .database import AsyncSessionLocal, init_db
 from .main import WORDLIST_DIR
 from .models import Wordlist
 
+# 删除孤儿文件时同时进行的 unlink 数量上限
+DELETE_CONCURRENCY = 32
+
 
 async def _fetch_referenced_paths() -> Set[str]:
     await init_db()
@@ -29,31 +32,32 @@ async def _fetch_referenced_paths() -> Set[str]:
 
 
 def _list_files(dir_path: str) -> List[str]:
-    entries: List[str] = []
-    for name in os.listdir(dir_path):
-        candidate = os.path.join(dir_path, name)
-        if os.path.isfile(candidate):
-            entries.append(os.path.abspath(candidate))
-    return entries
+    # scandir 的 DirEntry 自带目录项类型，is_file() 通常无需额外 stat
+    with os.scandir(dir_path) as it:
+        return [os.path.abspath(entry.path) for entry in it if entry.is_file()]
 
 
 async def find_orphan_wordlists(wordlist_dir: str) -> List[str]:
     referenced = await _fetch_referenced_paths()
-    existing = _list_files(wordlist_dir)
+    existing = await asyncio.to_thread(_list_files, wordlist_dir)
     return [path for path in existing if path not in referenced]
 
 
-def delete_files(paths: Iterable[str]) -> List[str]:
-    removed: List[str] = []
-    for path in paths:
-        try:
-            os.remove(path)
-            removed.append(path)
-        except FileNotFoundError:
-            continue
-        except PermissionError:
-            continue
-    return removed
+async def delete_files(paths: Iterable[str]) -> List[str]:
+    """并发删除文件，返回实际删除的路径（保持输入顺序）。"""
+    semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+
+    async def remove(path: str) -> bool:
+        async with semaphore:
+            try:
+                await asyncio.to_thread(os.remove, path)
+            except (FileNotFoundError, PermissionError):
+                return False
+            return True
+
+    targets = list(paths)
+    results = await asyncio.gather(*(remove(path) for path in targets))
+    return [path for path, ok in zip(targets, results) if ok]
 
 
 async def main() -> None:
@@ -89,7 +93,7 @@ async def main() -> None:
         print(f" - {path}")
 
     if args.delete and not args.dry_run:
-        removed = delete_files(orphans)
+        removed = await delete_files(orphans)
         print(f"\n已删除 {len(removed)} 个文件。")
     else:
         print("\n（dry-run）未删除，如需删除请加 --delete")
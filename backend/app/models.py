@@ -3,7 +3,7 @@ from __future__ import annotations
 import datetime as dt
 from typing import Optional
 
-from sqlalchemy import Column, DateTime, Text
+from sqlalchemy import Column, DateTime, Index, Text, text
 from sqlmodel import Field, SQLModel, UniqueConstraint
 
 
@@ -32,6 +32,8 @@ class Subdomain(SQLModel, table=True):
     __tablename__ = "subdomains"
     __table_args__ = (
         UniqueConstraint("run_id", "host"),
+        # 结果查询按 run_id 过滤、按发现时间排序，可直接走索引顺序扫描
+        Index("ix_subdomains_run_id_created_at", "run_id", "created_at"),
     )
 
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -50,6 +52,10 @@ class Subdomain(SQLModel, table=True):
 
 class Wordlist(SQLModel, table=True):
     __tablename__ = "wordlists"
+    __table_args__ = (
+        # 部分索引只收录默认字典；条件写作 IS 1，与查询中的 is_(True) 一致才能命中
+        Index("ix_wordlists_type_default", "type", sqlite_where=text("is_default IS 1")),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
@@ -1,9 +1,19 @@
+"""
+运行进度与停止标记的进程内存储。
+
+均为普通 dict，值为不可变元组：单次赋值与读取在 GIL 下是原子的，读者无需加锁。
+唯一的读-改-写 increment_progress 由 threading.Lock 保护，即便部署时有线程参与也不会丢失增量；
+枚举器只在每次批量入库后更新一次进度，锁几乎无竞争，读到的进度可能滞后一个批次。
+"""
+
 from __future__ import annotations
 
+import threading
 from typing import Dict, Optional, Tuple
 
 _progress: Dict[int, Tuple[Optional[int], int]] = {}
 _stops: Dict[int, bool] = {}
+_progress_lock = threading.Lock()
 
 
 def set_progress(run_id: int, total: Optional[int], processed: int) -> None:
@@ -12,11 +22,12 @@ def set_progress(run_id: int, total: Optional[int], processed: int) -> None:
 
 
 def increment_progress(run_id: int, processed_delta: int, total: Optional[int] = None) -> None:
-    total_now, processed_now = _progress.get(run_id, (total, 0))
-    if total is not None:
-        total_now = total
-    processed_now += processed_delta
-    _progress[run_id] = (total_now, processed_now)
+    """Add `processed_delta` to a run's processed count; callers should batch updates."""
+    with _progress_lock:
+        total_now, processed_now = _progress.get(run_id, (total, 0))
+        if total is not None:
+            total_now = total
+        _progress[run_id] = (total_now, processed_now + processed_delta)
 
 
 def clear_progress(run_id: int) -> None:
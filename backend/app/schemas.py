@@ -3,7 +3,7 @@ from __future__ import annotations
 import datetime as dt
 from typing import Any, List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 ProxyType = Literal["http", "https", "socks5"]
 Headers = dict[str, str]
@@ -15,6 +15,9 @@ class RunCreateRequest(BaseModel):
 
 
 class RunResponse(BaseModel):
+    # 允许直接从 SubdomainRun 实例按属性校验
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     domain: str
     status: str
@@ -59,7 +59,8 @@ def main():
             os.environ["REQUEST_TIMEOUT"] = "15"
             os.environ["VERIFY_SSL"] = "true"
             os.environ["ENABLE_GET_FALLBACK"] = "true"
-            print("🎯 精确模式：20并发，15秒超时，包含GET验证")
+            os.environ["ENABLE_TITLE_FETCH"] = "true"
+            print("🎯 精确模式：20并发，15秒超时，包含GET验证与标题抓取")
         else:
             print("❌ 未知参数")
             print_usage()
@@ -1,136 +1,251 @@
 import asyncio
+import inspect
+import io
+import logging
 import os
-from typing import AsyncGenerator
-
+import shlex
+import ssl
+import struct
+import sys
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import AsyncGenerator, Optional, Tuple
+from unittest.mock import AsyncMock, patch
+
+import aiohttp
 import pytest
 import pytest_asyncio
-from fastapi import BackgroundTasks
+from aiohttp import web
+from fastapi import HTTPException
 from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.orm import sessionmaker
-from sqlmodel import SQLModel
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlmodel import SQLModel, select
 from sqlmodel.ext.asyncio.session import AsyncSession
+from yarl import URL
+
+from app import database, http_enumerator, logging_config, run_progress
+from app import main as main_module
+from app.main import (
+    MAX_RESPONSE_BODY_CHARS,
+    _SHLEX_SPECIAL_CHARS,
+    _parse_curl_command,
+    _read_limited_text,
+    _test_socks5_proxy,
+    app,
+)
+from app.models import Subdomain, SubdomainRun
+
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+TEST_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-20000;",
+    "PRAGMA busy_timeout=5000;",
+)
+
+# Compiled once at import: the fresh test file needs no create_all existence checks,
+# and the whole schema goes through aiosqlite in a single executescript call
+SCHEMA_DDL = ";\n".join(
+    [
+        str(CreateTable(table).compile(dialect=sqlite.dialect())).strip()
+        for table in SQLModel.metadata.sorted_tables
+    ]
+    + [
+        str(CreateIndex(index).compile(dialect=sqlite.dialect()))
+        for table in SQLModel.metadata.sorted_tables
+        for index in table.indexes
+    ]
+) + ";"
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def db_engine(tmp_path_factory) -> AsyncGenerator[AsyncEngine, None]:
+    # One database file and schema for the whole session. Tests issue concurrent
+    # requests, which need separate connections: an in-memory database is bound to
+    # a single connection, where one request's rollback discards another's writes.
+    # Under pytest-xdist every worker gets its own file so workers never share a DB.
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+    test_db = tmp_path_factory.mktemp("db", numbered=False) / f"test_{worker}.db"
+    os.environ["TEST_DB"] = str(test_db)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{test_db}")
 
-from app import database
-from app.main import app
+    @event.listens_for(engine.sync_engine, "connect")
+    def _apply_test_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in TEST_SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
 
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        await raw_connection.driver_connection.executescript(SCHEMA_DDL)
 
-@pytest_asyncio.fixture(scope="function", autouse=True)
-async def temp_db(tmp_path) -> AsyncGenerator[None, None]:
-    test_db = tmp_path / "test.db"
-    os.environ["TEST_DB"] = str(test_db)
-    engine = create_async_engine(f"sqlite+aiosqlite:///{test_db}")
-    TestSessionLocal = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
+    yield engine
+
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture(autouse=True, loop_scope="session")
+async def temp_db(db_engine: AsyncEngine) -> AsyncGenerator[None, None]:
+    TestSessionLocal = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
 
     async def override_get_session() -> AsyncGenerator[AsyncSession, None]:
         async with TestSessionLocal() as session:
             yield session
 
     # Replace globals for the app runtime
-    database.engine = engine
+    database.engine = db_engine
     database.AsyncSessionLocal = TestSessionLocal
 
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
-
     app.dependency_overrides[database.get_session] = override_get_session
 
-    # Disable background execution during tests
-    app.dependency_overrides[BackgroundTasks] = lambda: BackgroundTasks()
-
     yield
 
-    app.dependency_overrides.clear()
-    await engine.dispose()
-
-
-@pytest.fixture(autouse=True)
-def disable_background(monkeypatch):
-    async def _noop(*args, **kwargs):
-        return None
-
-    monkeypatch.setattr("app.main._start_run_task", _noop)
-
-
-@pytest_asyncio.fixture
-async def api_client() -> AsyncGenerator[AsyncClient, None]:
+    # Only drop the override installed above
+    app.dependency_overrides.pop(database.get_session, None)
+    # Requests open and commit their own sessions, so they cannot join one outer
+    # transaction to roll back; empty every table instead to isolate tests
+    async with db_engine.begin() as conn:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            await conn.execute(table.delete())
+    # Row ids restart once the tables are empty, so drop in-process run state as well
+    run_progress._progress.clear()
+    run_progress._stops.clear()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def disable_background():
+    # Patched once for the session; a test that needs a real run swaps in its own runner
+    with patch("app.main._start_run_task", new=AsyncMock(return_value=None)) as patched:
+        yield patched
+
+
+@pytest.fixture(scope="module", autouse=True)
+def isolated_wordlist_dir(tmp_path_factory):
+    # Uploads land in a temp dir instead of the real data/wordlists
+    wordlist_dir = tmp_path_factory.mktemp("wordlists")
+    with patch("app.main.WORDLIST_DIR", str(wordlist_dir)), patch(
+        "app.maintenance.WORDLIST_DIR", str(wordlist_dir)
+    ):
+        yield wordlist_dir
+
+
+@pytest.fixture(scope="session", autouse=True)
+def warm_app():
+    # Build and cache the OpenAPI schema once per session; FastAPI already builds
+    # each route's dependency tree when the route is registered
+    app.openapi()
+    return app
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def api_client(warm_app) -> AsyncGenerator[AsyncClient, None]:
+    # Shared for the whole session; temp_db takes care of data isolation
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as client:
+        # warm_app has cached the schema, so this only primes the ASGI request path
+        # and keeps that one-time cost out of whichever test runs first
+        warmup = await client.get("/openapi.json")
+        assert warmup.status_code == 200
         yield client
 
 
-@pytest.mark.asyncio
-async def test_upload_wordlist_and_set_default(api_client: AsyncClient):
-    resp = await api_client.post(
-        "/wordlists",
-        files={"file": ("wl.txt", b"one\ntwo\n")},
-        data={"name": "custom.txt", "is_default": "true"},
+MULTIPART_BOUNDARY = "xtools-test-boundary"
+
+
+@lru_cache(maxsize=None)
+def _wordlist_multipart(filename: str, body: bytes, fields: Tuple[Tuple[str, str], ...]) -> Tuple[bytes, str]:
+    # Encode each distinct upload once; httpx would rebuild the multipart body per request
+    parts = [
+        f'--{MULTIPART_BOUNDARY}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode()
+        for key, value in fields
+    ]
+    parts.append(
+        f'--{MULTIPART_BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: text/plain\r\n\r\n".encode()
+        + body
+        + b"\r\n"
     )
-    assert resp.status_code == 200
-    data = resp.json()
+    parts.append(f"--{MULTIPART_BOUNDARY}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={MULTIPART_BOUNDARY}"
+
+
+@pytest.fixture
+def make_wordlist(api_client: AsyncClient):
+    async def _make(
+        body: bytes = b"a\nb\n",
+        filename: str = "wl.txt",
+        name: Optional[str] = None,
+        type_: str = "subdomain",
+        is_default: bool = False,
+    ) -> dict:
+        fields: Tuple[Tuple[str, str], ...] = (("type", type_), ("is_default", str(is_default).lower()))
+        if name is not None:
+            fields += (("name", name),)
+        content, content_type = _wordlist_multipart(filename, body, fields)
+        resp = await api_client.post("/wordlists", content=content, headers={"content-type": content_type})
+        assert resp.status_code == 200
+        return resp.json()
+
+    return _make
+
+
+@pytest.mark.parametrize("wl_type", ["subdomain", "username", "password"])
+async def test_upload_wordlist_and_set_default(api_client: AsyncClient, make_wordlist, wl_type: str):
+    data = await make_wordlist(b"one\ntwo\n", name="custom.txt", type_=wl_type, is_default=True)
     assert data["name"] == "custom.txt"
     assert data["is_default"] is True
-    assert data["type"] == "subdomain"
+    assert data["type"] == wl_type
 
-    resp2 = await api_client.get("/wordlists", params={"type": "subdomain"})
+    resp2 = await api_client.get("/wordlists", params={"type": wl_type})
     assert resp2.status_code == 200
     items = resp2.json()["items"]
     assert len(items) == 1
     assert items[0]["is_default"] is True
-    assert items[0]["type"] == "subdomain"
+    assert items[0]["type"] == wl_type
 
     # Set default on same wordlist (idempotent)
     resp3 = await api_client.post(f"/wordlists/{data['id']}/default")
     assert resp3.status_code == 200
 
 
-@pytest.mark.asyncio
-async def test_wordlist_type_filter_and_default_scope(api_client: AsyncClient):
-    username = await api_client.post(
-        "/wordlists",
-        files={"file": ("u.txt", b"user\nadmin\n")},
-        data={"type": "username", "is_default": "true"},
-    )
-    sub_one = await api_client.post(
-        "/wordlists",
-        files={"file": ("s1.txt", b"a\nb\n")},
-        data={"type": "subdomain", "is_default": "true"},
-    )
-    sub_two = await api_client.post(
-        "/wordlists",
-        files={"file": ("s2.txt", b"c\nd\n")},
-        data={"type": "subdomain"},
+async def test_wordlist_type_filter_and_default_scope(api_client: AsyncClient, make_wordlist):
+    # the uploads are independent of each other, so issue them concurrently
+    _, sub_one, sub_two = await asyncio.gather(
+        make_wordlist(b"user\nadmin\n", "u.txt", type_="username", is_default=True),
+        make_wordlist(b"a\nb\n", "s1.txt", is_default=True),
+        make_wordlist(b"c\nd\n", "s2.txt"),
     )
 
     # switch default within subdomain type only
-    resp = await api_client.post(f"/wordlists/{sub_two.json()['id']}/default")
+    resp = await api_client.post(f"/wordlists/{sub_two['id']}/default")
     assert resp.status_code == 200
 
-    resp_username = await api_client.get("/wordlists", params={"type": "username"})
+    # a TaskGroup cancels the sibling GET as soon as one of them fails
+    async with asyncio.TaskGroup() as tg:
+        username_task = tg.create_task(api_client.get("/wordlists", params={"type": "username"}))
+        sub_task = tg.create_task(api_client.get("/wordlists", params={"type": "subdomain"}))
+    resp_username, resp_sub = username_task.result(), sub_task.result()
     assert resp_username.status_code == 200
     username_items = resp_username.json()["items"]
     assert len(username_items) == 1
     assert username_items[0]["is_default"] is True
 
-    resp_sub = await api_client.get("/wordlists", params={"type": "subdomain"})
     assert resp_sub.status_code == 200
-    sub_items = resp_sub.json()["items"]
-    assert sub_items[0]["id"] == sub_two.json()["id"]
-    assert sub_items[0]["is_default"] is True
-    assert any(item["id"] == sub_one.json()["id"] and item["is_default"] is False for item in sub_items)
-
-
-@pytest.mark.asyncio
-async def test_wordlist_detail_and_update(api_client: AsyncClient):
-    created = await api_client.post(
-        "/wordlists",
-        files={"file": ("wl.txt", b"one\ntwo\n")},
-        data={"name": "origin.txt"},
-    )
-    assert created.status_code == 200
-    wordlist_id = created.json()["id"]
+    # uploads ran concurrently, so look items up by id rather than list position
+    sub_defaults = {item["id"]: item["is_default"] for item in resp_sub.json()["items"]}
+    assert sub_defaults == {sub_two["id"]: True, sub_one["id"]: False}
+
+
+async def test_wordlist_detail_and_update(api_client: AsyncClient, make_wordlist):
+    wordlist_id = (await make_wordlist(b"one\ntwo\n", name="origin.txt"))["id"]
 
     detail = await api_client.get(f"/wordlists/{wordlist_id}")
     assert detail.status_code == 200
@@ -153,14 +268,8 @@ async def test_wordlist_detail_and_update(api_client: AsyncClient):
     assert refetched.json()["content"] == "alpha\nbeta\n"
 
 
-@pytest.mark.asyncio
-async def test_wordlist_dedupe(api_client: AsyncClient):
-    created = await api_client.post(
-        "/wordlists",
-        files={"file": ("dup.txt", b"a\na\na\nb\nb \n\nc\n")},
-    )
-    assert created.status_code == 200
-    wordlist_id = created.json()["id"]
+async def test_wordlist_dedupe(api_client: AsyncClient, make_wordlist):
+    wordlist_id = (await make_wordlist(b"a\na\na\nb\nb \n\nc\n", "dup.txt"))["id"]
 
     deduped = await api_client.post(
         f"/wordlists/{wordlist_id}/dedupe",
@@ -173,26 +282,27 @@ async def test_wordlist_dedupe(api_client: AsyncClient):
     assert data["line_count"] == 3
     assert data["content"] == "a\nb\nc"
 
-    detail = await api_client.get(f"/wordlists/{wordlist_id}")
-    assert detail.status_code == 200
-    assert detail.json()["content"] == "a\nb\nc"
 
+async def test_wordlist_dedupe_stored_file(api_client: AsyncClient, make_wordlist):
+    wordlist_id = (await make_wordlist(b"a\r\na\nb \n\nb\rc\n", "dup.txt"))["id"]
 
-@pytest.mark.asyncio
-async def test_wordlist_delete_removes_record_and_file(api_client: AsyncClient, tmp_path, monkeypatch):
-    temp_dir = tmp_path / "wordlists"
-    temp_dir.mkdir()
-    monkeypatch.setattr("app.main.WORDLIST_DIR", str(temp_dir))
-    monkeypatch.setattr("app.maintenance.WORDLIST_DIR", str(temp_dir))
+    deduped = await api_client.post(f"/wordlists/{wordlist_id}/dedupe")
+    assert deduped.status_code == 200
+    data = deduped.json()
+    assert data["before_lines"] == 5
+    assert data["removed_lines"] == 2
+    assert data["content"] == "a\nb\nc"
+    assert data["size_bytes"] == len("a\nb\nc")
 
-    created = await api_client.post(
-        "/wordlists",
-        files={"file": ("del.txt", b"abc\n"), "name": (None, "del.txt")},
-    )
-    assert created.status_code == 200
-    wordlist_id = created.json()["id"]
-    files = list(temp_dir.iterdir())
-    assert files, "file should be created"
+
+async def test_wordlist_delete_removes_record_and_file(
+    api_client: AsyncClient, make_wordlist, isolated_wordlist_dir
+):
+    # the directory is shared by the module, so track only this test's file
+    existing = set(isolated_wordlist_dir.iterdir())
+    wordlist_id = (await make_wordlist(b"abc\n", "del.txt", name="del.txt"))["id"]
+    created = set(isolated_wordlist_dir.iterdir()) - existing
+    assert len(created) == 1, "file should be created"
 
     deleted = await api_client.delete(f"/wordlists/{wordlist_id}")
     assert deleted.status_code == 200
@@ -200,29 +310,25 @@ async def test_wordlist_delete_removes_record_and_file(api_client: AsyncClient,
     missing = await api_client.get(f"/wordlists/{wordlist_id}")
     assert missing.status_code == 404
     # file removed
-    assert len(list(temp_dir.iterdir())) == 0
+    assert not created.pop().exists()
 
 
-@pytest.mark.asyncio
-async def test_create_run_validates_domain_and_wordlist(api_client: AsyncClient):
+async def test_create_run_validates_domain_and_wordlist(api_client: AsyncClient, make_wordlist):
     bad = await api_client.post("/runs", json={"domain": "not-a-domain"})
     assert bad.status_code == 400
+    trailing_newline = await api_client.post("/runs", json={"domain": "example.com\n"})
+    assert trailing_newline.status_code == 400
 
     # wrong type should be rejected
-    wrong_type = await api_client.post(
-        "/wordlists",
-        files={"file": ("wl.txt", b"a\nb\n")},
-        data={"type": "password"},
-    )
+    wrong_type = await make_wordlist(type_="password")
     resp_wrong = await api_client.post(
         "/runs",
-        json={"domain": "example.com", "wordlist_id": wrong_type.json()["id"]},
+        json={"domain": "example.com", "wordlist_id": wrong_type["id"]},
     )
     assert resp_wrong.status_code == 400
 
     # create subdomain wordlist first
-    wl = await api_client.post("/wordlists", files={"file": ("wl.txt", b"a\nb\n")})
-    wordlist_id = wl.json()["id"]
+    wordlist_id = (await make_wordlist())["id"]
 
     resp = await api_client.post(
         "/runs",
@@ -233,3 +339,600 @@ async def test_create_run_validates_domain_and_wordlist(api_client: AsyncClient)
     assert data["domain"] == "example.com"
     assert data["status"] == "pending"
     assert data["wordlist_id"] == wordlist_id
+
+
+async def test_run_results_pagination(api_client: AsyncClient):
+    resp = await api_client.post("/runs", json={"domain": "example.com"})
+    run_id = resp.json()["id"]
+    async with database.AsyncSessionLocal() as session:
+        session.add_all(
+            Subdomain(run_id=run_id, host=f"h{i}.example.com", source="test")
+            for i in range(5)
+        )
+        await session.commit()
+
+    full = await api_client.get(f"/runs/{run_id}/results")
+    assert [r["host"] for r in full.json()["results"]] == [f"h{i}.example.com" for i in range(5)]
+
+    page = await api_client.get(f"/runs/{run_id}/results", params={"limit": 2, "offset": 3})
+    assert page.status_code == 200
+    assert [r["host"] for r in page.json()["results"]] == ["h3.example.com", "h4.example.com"]
+
+    invalid = await api_client.get(f"/runs/{run_id}/results", params={"limit": 0})
+    assert invalid.status_code == 422
+
+
+async def test_stop_running_run(api_client: AsyncClient, db_engine: AsyncEngine):
+    resp = await api_client.post("/runs", json={"domain": "example.com"})
+    run_id = resp.json()["id"]
+    async with database.AsyncSessionLocal() as session:
+        run = await session.get(SubdomainRun, run_id)
+        run.status = "running"
+        session.add(run)
+        await session.commit()
+
+    run_updates = []
+
+    def _record_run_update(conn, cursor, statement, parameters, context, executemany) -> None:
+        if statement.lstrip().upper().startswith("UPDATE SUBDOMAIN_RUNS"):
+            run_updates.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", _record_run_update)
+    try:
+        stopped = await api_client.post(f"/runs/{run_id}/stop")
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", _record_run_update)
+    assert stopped.status_code == 200
+    # the cancel is a single status-guarded UPDATE, with no autoflushed log write before it
+    assert len(run_updates) == 1
+    assert "status = ?" in run_updates[0].split("WHERE", 1)[1]
+    assert run_id not in http_enumerator._log_buffers
+    data = stopped.json()
+    assert data["status"] == "canceled"
+    assert data["finished_at"] is not None
+    assert data["log_snippet"].endswith("⏹ 任务已被用户停止")
+
+    status = await api_client.get(f"/runs/{run_id}")
+    assert status.json()["status"] == "canceled"
+
+
+class _FakeResolver:
+    """DNS stub: fixed A records for live hosts, NXDOMAIN for nx*, a wildcard IP otherwise."""
+
+    RECORDS = {"www.example.com": "10.0.0.1", "api.example.com": "10.0.0.2"}
+    WILDCARD_IP = "10.0.0.99"
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    async def query(self, host: str, qtype: str):
+        if qtype != "A" or host.startswith("nx"):
+            raise OSError("NXDOMAIN")
+        return [SimpleNamespace(host=self.RECORDS.get(host, self.WILDCARD_IP))]
+
+
+class _FakeResponse:
+    def __init__(self, url: str, status: int) -> None:
+        self.status = status
+        self.headers = {"content-type": "text/html", "server": "stub"}
+        self.url = URL(url)
+        self.history = ()
+        self.connection = None
+        self.content = SimpleNamespace(read=AsyncMock(return_value=b"<title>stub</title>"))
+
+    async def __aenter__(self) -> "_FakeResponse":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
+
+def _fake_http(session, *args, **kwargs) -> _FakeResponse:
+    # ClientSession.request(method, url) and ClientSession.get(url) share this stub
+    url = kwargs.get("url") or args[-1]
+    host = URL(url).host
+    if host in _FakeResolver.RECORDS:
+        return _FakeResponse(url, 200)
+    return _FakeResponse(url, 500)
+
+
+async def test_http_enumerator_pipeline(api_client: AsyncClient, make_wordlist):
+    words = b"www\napi\nWWW\nnx1\nnx2\nwc1\nwc2\nwc3\n"
+    wordlist_id = (await make_wordlist(words))["id"]
+    resp = await api_client.post("/runs", json={"domain": "example.com", "wordlist_id": wordlist_id})
+    run_id = resp.json()["id"]
+    # a row already stored for this run must be skipped by INSERT OR IGNORE, not raise
+    async with database.AsyncSessionLocal() as session:
+        session.add(Subdomain(run_id=run_id, host="www.example.com", source="seed"))
+        await session.commit()
+
+    progress = []
+    real_increment = http_enumerator.increment_progress
+
+    def _record_progress(run, delta, total=None) -> None:
+        real_increment(run, delta, total)
+        progress.append(run_progress.get_progress(run))
+
+    with patch.object(http_enumerator, "aiodns", SimpleNamespace(DNSResolver=_FakeResolver)), patch.object(
+        aiohttp.ClientSession, "request", _fake_http
+    ), patch.object(aiohttp.ClientSession, "get", _fake_http), patch.multiple(
+        http_enumerator,
+        DNS_CONCURRENCY=4,
+        MAX_CONCURRENT_REQUESTS=2,
+        RESULT_QUEUE_SIZE=1,
+        WILDCARD_PROBE_LIMIT=1,
+        increment_progress=_record_progress,
+    ):
+        async with database.AsyncSessionLocal() as session:
+            await http_enumerator.run_http_enumerator(session, run_id, "example.com", wordlist_id)
+
+    async with database.AsyncSessionLocal() as session:
+        run = await session.get(SubdomainRun, run_id)
+        rows = (await session.exec(select(Subdomain).where(Subdomain.run_id == run_id))).all()
+
+    hosts = {row.host: row.source for row in rows}
+    # wildcard hosts and NXDOMAIN candidates never become rows; the seeded row is kept as is
+    assert hosts == {"www.example.com": "seed", "api.example.com": "http_enumerator"}
+    assert run.status == "succeeded"
+    assert run.finished_at is not None
+    assert "总计发现 2 个" in run.log_snippet
+    assert "跳过 2 个仅命中泛解析的子域" in run.log_snippet
+    assert run_id not in http_enumerator._log_buffers
+
+    # 7 unique candidates: the total never changes and processed only moves forward
+    assert {total for total, _ in progress} == {7}
+    processed = [done for _, done in progress]
+    assert processed == sorted(processed)
+    assert processed[-1] == 7
+
+
+async def test_stop_run_while_enumerator_active(api_client: AsyncClient, make_wordlist, monkeypatch):
+    # run the real enumeration in the background task, against the test database
+    async def _start_run_task(run_id: int, domain: str, wordlist_id: Optional[int]) -> None:
+        async with database.AsyncSessionLocal() as session:
+            await main_module.run_subdomain_enumeration(session, run_id, domain, wordlist_id)
+
+    monkeypatch.setattr(main_module, "_start_run_task", _start_run_task)
+    wordlist_id = (await make_wordlist(b"www\napi\n"))["id"]
+    async with database.AsyncSessionLocal() as session:
+        run = SubdomainRun(domain="example.com", status="pending", wordlist_id=wordlist_id)
+        session.add(run)
+        await session.commit()
+        run_id = run.id
+
+    # hold the HTTP phase open so the stop request lands mid-run
+    probing = asyncio.Event()
+    release = asyncio.Event()
+
+    class _BlockingResponse(_FakeResponse):
+        async def __aenter__(self) -> "_FakeResponse":
+            probing.set()
+            await release.wait()
+            return self
+
+    def _blocking_http(session, *args, **kwargs) -> _FakeResponse:
+        return _BlockingResponse(kwargs.get("url") or args[-1], 200)
+
+    with patch.object(http_enumerator, "aiodns", SimpleNamespace(DNSResolver=_FakeResolver)), patch.object(
+        aiohttp.ClientSession, "request", _blocking_http
+    ), patch.object(aiohttp.ClientSession, "get", _blocking_http):
+        task = main_module._spawn_run_task(run_id, "example.com", wordlist_id)
+        await asyncio.wait_for(probing.wait(), timeout=5)
+        stopped = await api_client.post(f"/runs/{run_id}/stop")
+        assert stopped.json()["status"] == "canceled"
+        # the enumerator still owns the buffer, so its later flushes build on the stop line
+        assert run_id in http_enumerator._log_buffers
+        release.set()
+        await asyncio.wait_for(task, timeout=5)
+
+    async with database.AsyncSessionLocal() as session:
+        run = await session.get(SubdomainRun, run_id)
+    assert run.status == "canceled"
+    # probes in flight at stop time are logged after the endpoint's line, which is neither
+    # overwritten by the enumerator's stale snippet nor repeated by its own stop handling
+    assert run.log_snippet.count("⏹ 任务已被用户停止") == 1
+    assert "📈 新发现 2 个子域名" in run.log_snippet
+    assert run_id not in http_enumerator._log_buffers
+    assert run_id not in main_module._active_run_ids
+
+
+@pytest.fixture(params=["fast", "fallback"])
+def loguru_records(request, monkeypatch):
+    # Bind the handlers' loguru references without replacing the session's sinks;
+    # "fallback" exercises the public logger.opt(depth=...) path
+    logging_config._bind_loguru()
+    if request.param == "fallback":
+        monkeypatch.setattr(logging_config, "_logger_log", None)
+    records = []
+    sink_id = logger.add(lambda message: records.append(message.record), level="DEBUG", format="{message}")
+    yield records
+    logger.remove(sink_id)
+
+
+def _stdlib_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    std_logger = logging.getLogger(name)
+    std_logger.handlers = [handler]
+    std_logger.propagate = False
+    std_logger.setLevel(logging.DEBUG)
+    return std_logger
+
+
+async def test_intercepted_stdlib_records_reach_loguru(loguru_records):
+    std_logger = _stdlib_logger("xtools.test.intercept", logging_config.InterceptHandler())
+
+    warning_line = inspect.currentframe().f_lineno + 1
+    std_logger.warning("disk %s low", "space")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        exception_line = inspect.currentframe().f_lineno + 1
+        std_logger.exception("task failed")
+
+    warning, failure = loguru_records
+    assert warning["level"].name == "WARNING"
+    assert warning["message"] == "disk space low"
+    # the record points at this test, not at logging internals or the handler
+    assert (warning["file"].path, warning["line"]) == (__file__, warning_line)
+    assert warning["function"] == "test_intercepted_stdlib_records_reach_loguru"
+    assert warning["exception"] is None
+
+    assert failure["level"].name == "ERROR"
+    assert (failure["file"].path, failure["line"]) == (__file__, exception_line)
+    assert failure["exception"].type is ValueError
+
+
+async def test_access_log_handler_reports_caller(loguru_records):
+    std_logger = _stdlib_logger("xtools.test.access", logging_config.AccessLogHandler())
+
+    access_line = inspect.currentframe().f_lineno + 1
+    std_logger.info('%s - "%s %s"', "127.0.0.1", "GET", "/runs")
+
+    (record,) = loguru_records
+    assert record["level"].name == "INFO"
+    assert record["message"] == '127.0.0.1 - "GET /runs"'
+    # the fixed depth matches a direct Logger.info call, as uvicorn makes
+    assert (record["file"].path, record["line"]) == (__file__, access_line)
+
+
+async def test_setup_logging_keeps_sqlalchemy_warnings(monkeypatch):
+    stream = io.StringIO()
+    monkeypatch.setattr(logging_config, "_open_buffered_stdout", lambda: stream)
+    managed = [logging.root] + [logging.getLogger(name) for name, _ in logging_config._MANAGED_LOGGERS]
+    engine_logger = logging.getLogger("sqlalchemy.engine.Engine")
+    saved = [(lg, lg.handlers, lg.level, lg.propagate, lg.disabled) for lg in managed + [engine_logger]]
+    try:
+        logging_config.setup_logging()
+        # statement logging is skipped by the level check alone, not by disabling the logger
+        assert not engine_logger.isEnabledFor(logging.INFO)
+        engine_logger.info("SELECT 1")
+        engine_logger.warning("pool exhausted")
+        logger.complete()
+        output = stream.getvalue()
+        assert "pool exhausted" in output
+        assert "SELECT 1" not in output
+    finally:
+        logger.remove()
+        logger.configure(patcher=None)
+        logger.add(sys.stderr)
+        for lg, handlers, level, propagate, disabled in saved:
+            lg.handlers, lg.level, lg.propagate, lg.disabled = handlers, level, propagate, disabled
+        logging.Logger.manager._clear_cache()
+
+
+class _CountingStream(io.StringIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.flushes = 0
+
+    def flush(self) -> None:
+        self.flushes += 1
+        super().flush()
+
+
+def _log_message(text: str, level: str) -> str:
+    # loguru hands sinks a str subclass carrying the record
+    message = type("Message", (str,), {})(text)
+    message.record = {"level": logger.level(level)}
+    return message
+
+
+async def test_buffered_stdout_flushes_errors_immediately(monkeypatch):
+    # keep the periodic flush out of the way so only record-driven flushes are counted
+    monkeypatch.setattr(logging_config, "_STDOUT_FLUSH_INTERVAL", 60)
+    stream = _CountingStream()
+    sink = logging_config._BufferedStdout(stream)
+    try:
+        sink.write(_log_message("info\n", "INFO"))
+        assert stream.flushes == 0
+        sink.write(_log_message("error\n", "ERROR"))
+        assert stream.flushes == 1
+        assert stream.getvalue() == "info\nerror\n"
+    finally:
+        sink.stop()
+    # stop() flushes whatever is left when loguru removes the sink
+    assert stream.flushes == 2
+
+
+class _FakeSocks5Server:
+    """Minimal SOCKS5 proxy that records each frame and enforces RFC 1929 ordering."""
+
+    BOUND_ADDRS = {
+        0x01: b"\x7f\x00\x00\x01",
+        0x03: b"\x09localhost",
+        0x04: b"\x00" * 15 + b"\x01",
+    }
+
+    def __init__(self, *, require_auth: bool, accept_auth: bool = True, bound_atyp: int = 0x01) -> None:
+        self.require_auth = require_auth
+        self.accept_auth = accept_auth
+        self.bound_atyp = bound_atyp
+        self.credentials: Optional[Tuple[bytes, bytes]] = None
+        self.connect_target: Optional[Tuple[bytes, int]] = None
+        self.early_connect = False
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            _, nmethods = await reader.readexactly(2)
+            methods = await reader.readexactly(nmethods)
+            method = 0x02 if self.require_auth else 0x00
+            writer.write(bytes([0x05, method if method in methods else 0xFF]))
+            await writer.drain()
+            if method not in methods:
+                return
+            if self.require_auth:
+                _, ulen = await reader.readexactly(2)
+                username = await reader.readexactly(ulen)
+                password = await reader.readexactly((await reader.readexactly(1))[0])
+                self.credentials = (username, password)
+                # the client must wait for the auth reply before sending CONNECT
+                try:
+                    await asyncio.wait_for(reader.readexactly(1), timeout=0.05)
+                    self.early_connect = True
+                except asyncio.TimeoutError:
+                    pass
+                writer.write(bytes([0x01, 0x00 if self.accept_auth else 0x01]))
+                await writer.drain()
+                if not self.accept_auth:
+                    return
+            # VER, CMD, RSV; one byte is already consumed when CONNECT arrived early
+            await reader.readexactly(2 if self.early_connect else 3)
+            _, host_len = await reader.readexactly(2)
+            host = await reader.readexactly(host_len)
+            (port,) = struct.unpack("!H", await reader.readexactly(2))
+            self.connect_target = (host, port)
+            writer.write(bytes([0x05, 0x00, 0x00, self.bound_atyp]) + self.BOUND_ADDRS[self.bound_atyp] + b"\x00\x50")
+            await writer.drain()
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 OK\r\n\r\n")
+            await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, username: Optional[str], password: Optional[str]) -> None:
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        proxy = SimpleNamespace(host="127.0.0.1", port=port, username=username, password=password)
+        try:
+            await _test_socks5_proxy(proxy, "example.com", 80)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+
+@pytest.mark.parametrize("bound_atyp", [0x01, 0x03, 0x04])
+async def test_socks5_proxy_without_auth(bound_atyp: int):
+    fake = _FakeSocks5Server(require_auth=False, bound_atyp=bound_atyp)
+    await fake.run(None, None)
+    assert fake.credentials is None
+    assert fake.connect_target == (b"example.com", 80)
+
+
+async def test_socks5_proxy_with_user_pass():
+    fake = _FakeSocks5Server(require_auth=True)
+    await fake.run("üser", "secret")
+    # credential lengths are byte lengths of the UTF-8 encoding
+    assert fake.credentials == ("üser".encode(), b"secret")
+    assert fake.early_connect is False
+    assert fake.connect_target == (b"example.com", 80)
+
+
+async def test_socks5_proxy_rejected_auth_is_reported():
+    fake = _FakeSocks5Server(require_auth=True, accept_auth=False)
+    with pytest.raises(RuntimeError, match="认证失败"):
+        await fake.run("user", "wrong")
+    assert fake.connect_target is None
+
+
+async def test_socks5_proxy_requiring_auth_without_credentials():
+    fake = _FakeSocks5Server(require_auth=True)
+    with pytest.raises(RuntimeError, match="握手失败"):
+        await fake.run(None, None)
+
+
+@pytest.mark.parametrize(
+    ("command", "expected"),
+    [
+        # no quotes or backslashes: the str.split fast path
+        ("curl https://a.example/x", ("GET", "https://a.example/x", {}, None)),
+        (
+            "curl -H X-Token:abc --data a=1 https://a.example",
+            ("POST", "https://a.example", {"X-Token": "abc"}, "a=1"),
+        ),
+        (
+            "curl -X put --request patch https://a.example",
+            ("PATCH", "https://a.example", {}, None),
+        ),
+        # quoted and escaped arguments go through shlex
+        (
+            "curl -X post -H 'Content-Type: application/json' https://a.example -d '{\"a\": 1}'",
+            ("POST", "https://a.example", {"Content-Type": "application/json"}, '{"a": 1}'),
+        ),
+        (
+            'curl "https://a.example/q?x=1&y=2" --header "X-Name:  two words "',
+            ("GET", "https://a.example/q?x=1&y=2", {"X-Name": "two words"}, None),
+        ),
+        (
+            "curl https://a.example -H X-Name:\\ spaced --data-raw a\\\"b",
+            ("POST", "https://a.example", {"X-Name": "spaced"}, 'a"b'),
+        ),
+        # unknown flags are skipped, including ones that take a value
+        (
+            "curl -sS --compressed -k --max-time 5 -A agent https://a.example",
+            ("GET", "https://a.example", {}, None),
+        ),
+        (
+            "curl -H 'Accept: */*' --location -u 'user:pa ss' 'http://a.example'",
+            ("GET", "http://a.example", {"Accept": "*/*"}, None),
+        ),
+    ],
+)
+async def test_parse_curl_command(command: str, expected):
+    assert _parse_curl_command(command) == expected
+    if _SHLEX_SPECIAL_CHARS.isdisjoint(command):
+        # the fast path must agree with shlex wherever it is taken
+        assert command.split() == shlex.split(command)
+
+
+@pytest.mark.parametrize(
+    ("command", "detail"),
+    [
+        ("curl 'https://a.example", "无法解析 curl"),
+        ("curl -X POST", "未找到 URL"),
+        ("curl -H NoColon https://a.example", "无效请求头"),
+        ("   ", "curl 命令为空"),
+    ],
+)
+async def test_parse_curl_command_rejects_invalid(command: str, detail: str):
+    with pytest.raises(HTTPException) as exc_info:
+        _parse_curl_command(command)
+    assert exc_info.value.status_code == 400
+    assert detail in exc_info.value.detail
+
+
+async def test_request_ssl_context_is_cached(monkeypatch):
+    monkeypatch.setattr(main_module, "_request_ssl_context", None)
+    monkeypatch.setattr(main_module, "REQUEST_TEST_VERIFY_SSL", False)
+    ctx = main_module._get_request_ssl_context()
+    assert main_module._get_request_ssl_context() is ctx
+    assert ctx.verify_mode == ssl.CERT_NONE
+    assert ctx.check_hostname is False
+
+
+class _ChunkedBody:
+    def __init__(self, chunks) -> None:
+        self.chunks = list(chunks)
+        self.consumed = 0
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            self.consumed += 1
+            yield chunk
+
+
+@pytest.mark.parametrize(
+    ("body", "charset", "expected"),
+    [
+        (b"short body", None, "short body"),
+        ("é".encode("latin-1") * 10, "latin-1", "é" * 10),
+        # a charset aiohttp reports but Python does not know falls back to UTF-8
+        ("ok".encode(), "x-unknown", "ok"),
+    ],
+)
+async def test_read_limited_text_decodes(body: bytes, charset: Optional[str], expected: str):
+    resp = SimpleNamespace(content=_ChunkedBody([body]), charset=charset)
+    assert await _read_limited_text(resp) == expected
+
+
+async def test_read_limited_text_truncates_large_body():
+    byte_limit = MAX_RESPONSE_BODY_CHARS * 4
+    assert byte_limit == 32000
+    # 40 chunks of 1000 bytes: reading stops once the 32000-byte cap is passed
+    body = _ChunkedBody([b"x" * 1000] * 40)
+    resp = SimpleNamespace(content=body, charset="utf-8")
+    text = await _read_limited_text(resp)
+    assert text == "x" * MAX_RESPONSE_BODY_CHARS + "\n...[truncated]"
+    assert body.consumed == byte_limit // 1000 + 1
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def cookie_server() -> AsyncGenerator[str, None]:
+    # Every response sets a cookie and echoes back whatever Cookie header arrived
+    async def handle(request: web.Request) -> web.Response:
+        resp = web.Response(text=request.headers.get("Cookie", ""))
+        resp.set_cookie("session", "leaked")
+        return resp
+
+    web_app = web.Application()
+    web_app.router.add_get("/", handle)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        # a hostname rather than the IP: aiohttp's cookie jar ignores cookies set by bare IPs
+        yield f"http://localhost:{port}/"
+    finally:
+        await runner.cleanup()
+
+
+async def test_request_tests_do_not_replay_cookies(api_client: AsyncClient, cookie_server: str):
+    for count in (2, 1):
+        resp = await api_client.post("/request-tests", json={"curl": f"curl {cookie_server}", "count": count})
+        assert resp.status_code == 200
+        results = resp.json()["results"]
+        assert [r["status"] for r in results] == [200] * count
+        # neither later requests in the batch nor a later request test send the Set-Cookie back
+        assert [r["body"] for r in results] == [""] * count
+
+
+async def _socks5_relay(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # No-auth SOCKS5 proxy that tunnels CONNECT to 127.0.0.1, whatever host was asked for
+    try:
+        _, nmethods = await reader.readexactly(2)
+        await reader.readexactly(nmethods)
+        writer.write(b"\x05\x00")
+        _, _, _, atyp = await reader.readexactly(4)
+        if atyp == 0x03:
+            await reader.readexactly((await reader.readexactly(1))[0])
+        else:
+            await reader.readexactly(4 if atyp == 0x01 else 16)
+        (port,) = struct.unpack("!H", await reader.readexactly(2))
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"\x05\x00\x00\x01\x7f\x00\x00\x01" + struct.pack("!H", port))
+
+        async def pipe(src: asyncio.StreamReader, dst: asyncio.StreamWriter) -> None:
+            while chunk := await src.read(65536):
+                dst.write(chunk)
+                await dst.drain()
+            dst.close()
+
+        await asyncio.gather(pipe(reader, upstream_writer), pipe(upstream_reader, writer))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def test_socks5_request_tests_do_not_replay_cookies(api_client: AsyncClient, cookie_server: str):
+    server = await asyncio.start_server(_socks5_relay, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        created = await api_client.post(
+            "/proxies", json={"name": "relay", "type": "socks5", "host": "127.0.0.1", "port": port}
+        )
+        assert created.status_code == 200
+        resp = await api_client.post(
+            "/request-tests",
+            json={"curl": f"curl {cookie_server}", "count": 3, "proxy_id": created.json()["id"]},
+        )
+        assert resp.status_code == 200
+        results = resp.json()["results"]
+        assert [r["status"] for r in results] == [200] * 3
+        # requests 2..N of the batch are independent replays, not carriers of request 1's cookie
+        assert [r["body"] for r in results] == [""] * 3
+    finally:
+        server.close()
+        await server.wait_closed()